@@ -0,0 +1,69 @@
+"""比較截圖取樣模式（seek / sequential / ffmpeg）的效能。
+
+用法: python -m benchmarks.bench_frame_sampling --duration 600 --interval 10
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.frame_sampler import SAMPLING_MODES, extract_screenshots
+
+
+def make_synthetic_video(path, duration, fps=30, size=(1280, 720)):
+    """產生測試影片；有 ffmpeg 時以 H.264 長 GOP 編碼，以重現實際 YouTube 影片的跳轉成本。"""
+    if shutil.which('ffmpeg'):
+        subprocess.run([
+            'ffmpeg', '-y', '-loglevel', 'error',
+            '-f', 'lavfi', '-i', f"testsrc2=size={size[0]}x{size[1]}:rate={fps}",
+            '-t', str(duration),
+            '-c:v', 'libx264', '-preset', 'ultrafast', '-g', '250',
+            '-pix_fmt', 'yuv420p', path
+        ], check=True)
+        return
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    frame = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+    for i in range(int(duration * fps)):
+        frame[:] = (i * 7 % 255, i * 3 % 255, i % 255)
+        cv2.putText(frame, str(i), (50, 200), cv2.FONT_HERSHEY_SIMPLEX, 5, (255, 255, 255), 8)
+        writer.write(frame)
+    writer.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--duration', type=int, default=300, help='測試影片長度（秒）')
+    parser.add_argument('--interval', type=int, default=10, help='截圖間隔（秒）')
+    parser.add_argument('--video', help='使用現有影片而非產生測試影片')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='bench_frames_')
+    try:
+        video_path = args.video
+        if not video_path:
+            video_path = os.path.join(work_dir, 'synthetic.mp4')
+            make_synthetic_video(video_path, args.duration)
+
+        modes = [mode for mode in SAMPLING_MODES if mode != 'ffmpeg' or shutil.which('ffmpeg')]
+        for mode in modes:
+            output_folder = os.path.join(work_dir, mode)
+            os.makedirs(output_folder)
+            start = time.perf_counter()
+            screenshots = extract_screenshots(video_path, output_folder, 'bench', args.interval, mode)
+            elapsed = time.perf_counter() - start
+            print(f"{mode:<12} {elapsed:8.2f}s  {len(screenshots)} 張截圖")
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""比較影片頁面截圖/字幕配對的效能：原本的正則解析 + 線性掃描、二分搜尋配對，以及含資料庫讀取與快取的完整路徑。
+
+用法: python -m benchmarks.bench_pairing --hours 3 --cue-seconds 2.5 --interval 10
+"""
+import os
+import re
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from utils.vtt import parse_cues
+from utils.pairing import pair_screenshots, load_paired_data
+
+
+def format_vtt_timestamp(seconds):
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{seconds:06.3f}"
+
+
+def make_vtt(duration, cue_seconds, prefix):
+    lines = ['WEBVTT', '']
+    start = 0.0
+    index = 0
+    while start < duration:
+        end = min(start + cue_seconds, duration)
+        lines += [f"{format_vtt_timestamp(start)} --> {format_vtt_timestamp(end)}", f"{prefix} {index}", '']
+        start = end
+        index += 1
+    return '\n'.join(lines)
+
+
+def make_screenshots(duration, interval):
+    return [{'filename': f"bench_{t:.2f}.jpg", 'timestamp': f"{t:.2f}s"} for t in range(0, int(duration), interval)]
+
+
+# 原本 main.process_video_data 的實作，作為比較基準
+def legacy_timestamp_to_seconds(timestamp):
+    t = datetime.strptime(timestamp, '%H:%M:%S.%f')
+    return timedelta(hours=t.hour, minutes=t.minute, seconds=t.second, microseconds=t.microsecond).total_seconds()
+
+
+def legacy_pairing(screenshots, translation, transcription):
+    pattern = r'(\d{2}:\d{2}:\d{2}\.\d{3}) --> (\d{2}:\d{2}:\d{2}\.\d{3})\n(.*?)(?:\n\n|$)'
+    tracks = []
+    for vtt in (translation, transcription):
+        tracks.append([
+            {'start': legacy_timestamp_to_seconds(start), 'end': legacy_timestamp_to_seconds(end), 'text': text.strip()}
+            for start, end, text in re.findall(pattern, vtt, re.DOTALL)
+        ])
+    paired_data = []
+    for i, screenshot in enumerate(screenshots):
+        current_time = float(screenshot['timestamp'].replace('s', ''))
+        next_time = float(screenshots[i + 1]['timestamp'].replace('s', '')) if i + 1 < len(screenshots) else float('inf')
+        matches = [[subtitle for subtitle in track if current_time <= subtitle['start'] < next_time]
+                   for track in tracks]
+        paired_data.append({'screenshot': screenshot, 'translated_subtitles': matches[0],
+                            'original_subtitles': matches[1]})
+    return paired_data
+
+
+def timeit(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--hours', type=float, default=3, help='測試影片長度（小時）')
+    parser.add_argument('--cue-seconds', type=float, default=2.5, help='每條字幕的長度（秒）')
+    parser.add_argument('--interval', type=int, default=10, help='截圖間隔（秒）')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    duration = args.hours * 3600
+    transcription = make_vtt(duration, args.cue_seconds, 'original')
+    translation = make_vtt(duration, args.cue_seconds, 'translated')
+    screenshots = make_screenshots(duration, args.interval)
+    print(f"{len(screenshots)} 張截圖，每軌 {len(parse_cues(transcription))} 條字幕")
+
+    work_dir = tempfile.mkdtemp(prefix='bench_pairing_')
+    try:
+        # 使用暫存資料庫，不影響 videos.db
+        database.DATABASE_NAME = os.path.join(work_dir, 'videos.db')
+        database.init_db()
+        database.add_video({
+            'youtube_id': 'bench', 'title': 'bench', 'description': '', 'creator': '', 'timestamp': '',
+            'duration': '', 'language': 'en', 'processed_at': datetime.now().isoformat(),
+            'screenshots': screenshots, 'transcription': transcription, 'translation': translation,
+            'summary': '', 'subtitle_used': True
+        })
+
+        legacy_time, legacy_result = timeit(lambda: legacy_pairing(screenshots, translation, transcription),
+                                            max(1, args.repeat // 5))
+        translated_cues, original_cues = parse_cues(translation), parse_cues(transcription)
+        bisect_time, bisect_result = timeit(
+            lambda: pair_screenshots(screenshots, translated_cues, original_cues), args.repeat)
+        assert bisect_result == legacy_result
+
+        def view(cached):
+            if not cached:
+                load_paired_data.cache_clear()
+            video = database.get_all_videos(youtube_id='bench')
+            return load_paired_data(video['youtube_id'], video['processed_at'])
+
+        cold_time, _ = timeit(lambda: view(cached=False), args.repeat)
+        warm_time, _ = timeit(lambda: view(cached=True), args.repeat)
+
+        print(f"{'原本（正則 + strptime + 線性掃描）':<24} {legacy_time * 1000:10.1f} ms")
+        print(f"{'二分搜尋配對（不含讀取）':<24} {bisect_time * 1000:10.1f} ms")
+        print(f"{'頁面路徑（資料庫讀取 + 配對）':<24} {cold_time * 1000:10.1f} ms")
+        print(f"{'頁面路徑（快取命中）':<24} {warm_time * 1000:10.1f} ms")
+    finally:
+        database.close_connections()
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""比較原本各處各自的 VTT 正則解析與共用的逐行解析器（utils.vtt.parse_vtt）的速度與記憶體用量。
+
+原本同一份字幕會被解析三次：資料庫寫入的 CUE_TIMING_PATTERN、摘要前的 CUE_PATTERN，以及語言偵測前的逐行切分；
+現在解析一次即得到 starts / ends / texts 平行陣列。
+
+用法: python -m benchmarks.bench_vtt_parser --cues 10000
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.vtt import parse_vtt, format_vtt_timestamp
+
+
+# 原本的實作，作為比較基準
+LEGACY_CUE_TIMING_PATTERN = re.compile(
+    r'(\d{2}:\d{2}:\d{2}\.\d{3}) --> (\d{2}:\d{2}:\d{2}\.\d{3})[^\n]*\n(.*?)(?:\n\n|$)', re.DOTALL)
+LEGACY_CUE_PATTERN = re.compile(
+    r'(\d{2}:\d{2}:\d{2}\.\d{3} --> \d{2}:\d{2}:\d{2}\.\d{3})\n((?:(?!\n\d{2}:\d{2}:\d{2}\.\d{3}).)+)', re.DOTALL)
+
+
+def legacy_parse_cues(vtt_content):
+    def to_seconds(timestamp):
+        hours, minutes, seconds = timestamp.split(':')
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    return [{'start': to_seconds(start), 'end': to_seconds(end), 'text': text.strip()}
+            for start, end, text in LEGACY_CUE_TIMING_PATTERN.findall(vtt_content)]
+
+
+def legacy_cue_texts(vtt_content):
+    return [text.strip() for _, text in LEGACY_CUE_PATTERN.findall(vtt_content)]
+
+
+def legacy_extract_text(vtt_content):
+    return ' '.join(line.strip() for line in vtt_content.split('\n')
+                    if line.strip() and '-->' not in line and line.strip() != 'WEBVTT')
+
+
+def legacy_all(vtt_content):
+    return legacy_parse_cues(vtt_content), legacy_cue_texts(vtt_content), legacy_extract_text(vtt_content)
+
+
+def short_timestamp(seconds):
+    # 不足一小時時省略小時欄位（MM:SS.mmm）
+    timestamp = format_vtt_timestamp(seconds)
+    return timestamp[3:] if timestamp.startswith('00:') else timestamp
+
+
+def make_vtt(count, cue_seconds, full_featured):
+    """full_featured=True 時加入 cue 識別碼、cue 設定、NOTE / STYLE 區塊與省略小時的時間戳。"""
+    lines = ['WEBVTT', 'Kind: captions', 'Language: en', '']
+    if full_featured:
+        lines += ['STYLE', '::cue { color: white; }', '', 'NOTE 以下為測試字幕', '']
+    for index in range(count):
+        start, end = index * cue_seconds, (index + 1) * cue_seconds
+        if full_featured:
+            lines += [f"cue-{index}",
+                      f"{short_timestamp(start)} --> {short_timestamp(end)} align:start position:0%"]
+        else:
+            lines.append(f"{format_vtt_timestamp(start)} --> {format_vtt_timestamp(end)}")
+        lines += [f"line {index} of the benchmark subtitles", f"second line {index}", '']
+    return '\n'.join(lines)
+
+
+def measure(func, content, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(content)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    result = func(content)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, size, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cues', type=int, default=10000, help='測試字幕條數')
+    parser.add_argument('--cue-seconds', type=float, default=2.5)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for full_featured in (False, True):
+        content = make_vtt(args.cues, args.cue_seconds, full_featured)
+        print(f"\n{'完整語法（識別碼、設定、NOTE/STYLE、MM:SS）' if full_featured else '基本語法'}: "
+              f"{args.cues} 條字幕，{len(content) / 1024:.0f} KB")
+
+        legacy_time, legacy_size, (legacy_cues, _, _) = measure(legacy_all, content, args.repeat)
+        parse_time, parse_size, cues = measure(parse_vtt, content, args.repeat)
+        if not full_featured:
+            assert list(cues) == legacy_cues
+
+        print(f"{'原本（三次正則 / 切分，字典列表）':<24} {legacy_time * 1000:8.1f} ms {legacy_size / 1024:8.0f} KB"
+              f" {len(legacy_cues):6d} 條")
+        print(f"{'parse_vtt（一次解析，平行陣列）':<24} {parse_time * 1000:8.1f} ms {parse_size / 1024:8.0f} KB"
+              f" {len(cues):6d} 條")
+
+
+if __name__ == '__main__':
+    main()
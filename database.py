@@ -1,8 +1,14 @@
 import os
+import re
 import sqlite3
 import json
 import glob
 import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from utils.vtt import parse_vtt, normalize_cues
+from utils.metrics import timed_query
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -11,186 +17,673 @@ logger = logging.getLogger(__name__)
 
 DATABASE_NAME = 'videos.db'
 
+# 連線池：閒置連線保留數上限，超過時歸還的連線會被關閉
+POOL_SIZE = 8
+# 每個連線快取的預編譯語句數（sqlite3 依 SQL 文字重用已編譯的語句）
+STATEMENT_CACHE_SIZE = 256
+BUSY_TIMEOUT_MS = 30000  # 寫入衝突時等待的時間，而不是立即拋出 database is locked
+MMAP_SIZE = 256 * 1024 * 1024
+CACHE_SIZE_KB = 64 * 1024
+
+# 資料庫結構版本（記錄在 PRAGMA user_version），init_db 依此自動遷移舊資料
+SCHEMA_VERSION = 3
+# process_vtt 的輸出一律為繁體中文
+TRANSLATION_LANGUAGE = 'zh-TW'
+# 影片列表每頁的預設與最大筆數
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# 全文搜尋：返回的影片數、每支影片最多考慮的字幕命中數、摘錄長度（trigram 下約等於字數）
+SEARCH_LIMIT = 20
+SEARCH_CUE_HITS_PER_VIDEO = 5
+SNIPPET_TOKENS = 16
+
+_pool = []
+_pool_lock = threading.Lock()
+_local = threading.local()
+
+
+def _connect():
+    conn = sqlite3.connect(DATABASE_NAME, check_same_thread=False, isolation_level=None,
+                           cached_statements=STATEMENT_CACHE_SIZE)
+    conn.row_factory = sqlite3.Row
+    # WAL 模式下讀取不會被進行中的寫入阻擋（寫入也不會阻擋讀取）
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+    conn.execute(f'PRAGMA cache_size=-{CACHE_SIZE_KB}')
+    conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+    conn.execute('PRAGMA foreign_keys=ON')
+    return conn
+
+
+@contextmanager
+def connection():
+    """從連線池借出一個連線（自動提交模式），用完後歸還。
+
+    在 transaction() 內呼叫時返回同一個連線，讀取可看到尚未提交的寫入。
+    """
+    current = getattr(_local, 'conn', None)
+    if current is not None:
+        yield current
+        return
+
+    conn = None
+    with _pool_lock:
+        while _pool and conn is None:
+            path, pooled = _pool.pop()
+            if path == DATABASE_NAME:
+                conn = pooled
+            else:
+                pooled.close()
+    if conn is None:
+        conn = _connect()
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        with _pool_lock:
+            if len(_pool) < POOL_SIZE:
+                _pool.append((DATABASE_NAME, conn))
+                conn = None
+        if conn is not None:
+            conn.close()
+
+
+@contextmanager
+def transaction():
+    """以 BEGIN IMMEDIATE 開始寫入交易，正常結束時提交、發生例外時回滾；可巢狀使用（併入外層交易）。"""
+    if getattr(_local, 'conn', None) is not None:
+        yield _local.conn
+        return
+
+    with connection() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        _local.conn = conn
+        try:
+            yield conn
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            _local.conn = None
+
+
+def close_connections():
+    """關閉連線池中所有閒置的連線。"""
+    with _pool_lock:
+        while _pool:
+            _pool.pop()[1].close()
+
+
 def init_db():
-    conn = sqlite3.connect(DATABASE_NAME)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS videos
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  youtube_id TEXT UNIQUE,
-                  title TEXT,
-                  description TEXT,
-                  creator TEXT,
-                  timestamp TEXT,
-                  duration TEXT,
-                  language TEXT,
-                  processed_at TEXT,
-                  screenshots TEXT,
-                  transcription TEXT,
-                  translation TEXT,
-                  summary TEXT,
-                  subtitle_used BOOLEAN)
-                 ''')
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute('''CREATE TABLE IF NOT EXISTS videos
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      youtube_id TEXT UNIQUE,
+                      title TEXT,
+                      description TEXT,
+                      creator TEXT,
+                      timestamp TEXT,
+                      duration TEXT,
+                      language TEXT,
+                      processed_at TEXT,
+                      screenshots TEXT,
+                      transcription TEXT,
+                      translation TEXT,
+                      summary TEXT,
+                      subtitle_used BOOLEAN,
+                      metrics TEXT)
+                     ''')
+        conn.execute('''CREATE TABLE IF NOT EXISTS jobs
+                     (id TEXT PRIMARY KEY,
+                      youtube_url TEXT,
+                      params TEXT,
+                      status TEXT,
+                      stage TEXT,
+                      progress REAL,
+                      error TEXT,
+                      youtube_id TEXT,
+                      created_at TEXT,
+                      updated_at TEXT)
+                     ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)')
+        # 處理階段的檢查點（見 utils.checkpoints）；影片記錄在處理完成後才建立，因此以 youtube_id 為鍵
+        conn.execute('''CREATE TABLE IF NOT EXISTS checkpoints
+                     (youtube_id TEXT,
+                      stage TEXT,
+                      fingerprint TEXT,
+                      output TEXT,
+                      updated_at TEXT,
+                      PRIMARY KEY (youtube_id, stage))
+                     ''')
+        # 截圖與字幕存放於子表，頁面只需讀取所需的列，不必解析整段 JSON 或 VTT
+        conn.execute('''CREATE TABLE IF NOT EXISTS screenshots
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      video_id INTEGER NOT NULL REFERENCES videos (id) ON DELETE CASCADE,
+                      start REAL,
+                      filename TEXT,
+                      timestamp TEXT)
+                     ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_screenshots_video ON screenshots (video_id, start)')
+        conn.execute('''CREATE TABLE IF NOT EXISTS cues
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      video_id INTEGER NOT NULL REFERENCES videos (id) ON DELETE CASCADE,
+                      track TEXT,
+                      lang TEXT,
+                      start REAL,
+                      end REAL,
+                      text TEXT)
+                     ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_cues_video ON cues (video_id, track, start)')
+        # 列表查詢的覆蓋索引：依 processed_at 排序並包含卡片欄位，分頁時不必回表讀取整列
+        conn.execute('''CREATE INDEX IF NOT EXISTS idx_videos_listing
+                        ON videos (processed_at, id, youtube_id, title, creator, timestamp, duration, language,
+                                   subtitle_used)''')
+
+        _create_search_index(conn)
+
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version < 1:
+            _migrate_to_child_tables(conn)
+        if version < 2:
+            # 為既有資料建立全文索引，之後由觸發器同步
+            conn.execute("INSERT INTO videos_fts (videos_fts) VALUES ('rebuild')")
+            conn.execute("INSERT INTO cues_fts (cues_fts) VALUES ('rebuild')")
+        if version < 3:
+            columns = [row['name'] for row in conn.execute('PRAGMA table_info(videos)')]
+            if 'metrics' not in columns:
+                conn.execute('ALTER TABLE videos ADD COLUMN metrics TEXT')
+        conn.execute(f'PRAGMA user_version={SCHEMA_VERSION}')
+
+
+def _create_search_index(conn):
+    """建立 FTS5 全文索引（外部內容表，不重複儲存文字）與同步用的觸發器。
+
+    trigram 分詞器以三個字元為單位建立索引，中日韓文字不需斷詞即可搜尋。
+    """
+    conn.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS videos_fts
+                    USING fts5(title, description, creator, summary,
+                               content='videos', content_rowid='id', tokenize='trigram')''')
+    conn.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS cues_fts
+                    USING fts5(text, content='cues', content_rowid='id', tokenize='trigram')''')
+    triggers = [
+        '''CREATE TRIGGER IF NOT EXISTS videos_fts_insert AFTER INSERT ON videos BEGIN
+               INSERT INTO videos_fts (rowid, title, description, creator, summary)
+               VALUES (new.id, new.title, new.description, new.creator, new.summary);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS videos_fts_delete AFTER DELETE ON videos BEGIN
+               INSERT INTO videos_fts (videos_fts, rowid, title, description, creator, summary)
+               VALUES ('delete', old.id, old.title, old.description, old.creator, old.summary);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS videos_fts_update
+           AFTER UPDATE OF title, description, creator, summary ON videos BEGIN
+               INSERT INTO videos_fts (videos_fts, rowid, title, description, creator, summary)
+               VALUES ('delete', old.id, old.title, old.description, old.creator, old.summary);
+               INSERT INTO videos_fts (rowid, title, description, creator, summary)
+               VALUES (new.id, new.title, new.description, new.creator, new.summary);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS cues_fts_insert AFTER INSERT ON cues BEGIN
+               INSERT INTO cues_fts (rowid, text) VALUES (new.id, new.text);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS cues_fts_delete AFTER DELETE ON cues BEGIN
+               INSERT INTO cues_fts (cues_fts, rowid, text) VALUES ('delete', old.id, old.text);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS cues_fts_update AFTER UPDATE OF text ON cues BEGIN
+               INSERT INTO cues_fts (cues_fts, rowid, text) VALUES ('delete', old.id, old.text);
+               INSERT INTO cues_fts (rowid, text) VALUES (new.id, new.text);
+           END''',
+    ]
+    # executescript 會先提交進行中的交易，因此逐條執行
+    for trigger in triggers:
+        conn.execute(trigger)
+
+
+def _migrate_to_child_tables(conn):
+    """將舊版 videos.screenshots（JSON）與 transcription/translation（VTT）拆分寫入子表。"""
+    rows = conn.execute(
+        'SELECT id, language, screenshots, transcription, translation FROM videos WHERE screenshots IS NOT NULL'
+    ).fetchall()
+    for row in rows:
+        _write_children(conn, row['id'], {
+            'language': row['language'],
+            'screenshots': json.loads(row['screenshots']),
+            'transcription': row['transcription'],
+            'translation': row['translation'],
+        })
+    # VTT 全文仍保留在 videos 表供頁面顯示；截圖 JSON 已無用途
+    conn.execute('UPDATE videos SET screenshots = NULL')
+    if rows:
+        logger.info(f"已將 {len(rows)} 支影片的截圖與字幕遷移至子表")
+
 
+def _screenshot_start(screenshot):
+    return float(screenshot['timestamp'].replace('s', ''))
+
+
+def _write_children(conn, video_id, video_info):
+    conn.execute('DELETE FROM screenshots WHERE video_id = ?', (video_id,))
+    conn.execute('DELETE FROM cues WHERE video_id = ?', (video_id,))
+    conn.executemany(
+        'INSERT INTO screenshots (video_id, start, filename, timestamp) VALUES (?, ?, ?, ?)',
+        [(video_id, _screenshot_start(screenshot), screenshot['filename'], screenshot['timestamp'])
+         for screenshot in video_info.get('screenshots') or []])
+    # 原始字幕保留原本的時間切分，只移除行內標籤與捲動重複；翻譯在產生時已正規化
+    transcription_cues = normalize_cues(parse_vtt(video_info.get('transcription')), merge=False)
+    tracks = (('transcription', video_info.get('language'), transcription_cues),
+              ('translation', TRANSLATION_LANGUAGE, parse_vtt(video_info.get('translation'))))
+    for track, lang, cues in tracks:
+        conn.executemany(
+            'INSERT INTO cues (video_id, track, lang, start, end, text) VALUES (?, ?, ?, ?, ?, ?)',
+            [(video_id, track, lang, start, end, text) for start, end, text in zip(cues.starts, cues.ends, cues.texts)])
+
+
+def _dump_metrics(video_info):
+    return json.dumps(video_info['metrics']) if video_info.get('metrics') else None
+
+
+@timed_query
 def add_video(video_info):
-    conn = sqlite3.connect(DATABASE_NAME)
-    c = conn.cursor()
-    c.execute(
-        '''INSERT INTO videos (youtube_id, title, description, creator, timestamp, duration, language, processed_at, screenshots, transcription, translation, summary, subtitle_used)
-         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-        (
-            video_info['youtube_id'],
-            video_info['title'],
-            video_info['description'],
-            video_info['creator'],
-            video_info['timestamp'],
-            video_info['duration'],
-            video_info['language'],
-            video_info['processed_at'],
-            json.dumps(video_info['screenshots']),
-            video_info.get('transcription'),
-            video_info.get('translation'),
-            video_info.get('summary'),
-            video_info.get('subtitle_used', False)
-        ))
-    video_id = c.lastrowid
-    conn.commit()
-    conn.close()
-    return video_id
+    with transaction() as conn:
+        c = conn.execute(
+            '''INSERT INTO videos (youtube_id, title, description, creator, timestamp, duration, language, processed_at, transcription, translation, summary, subtitle_used, metrics)
+             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            (
+                video_info['youtube_id'],
+                video_info['title'],
+                video_info['description'],
+                video_info['creator'],
+                video_info['timestamp'],
+                video_info['duration'],
+                video_info['language'],
+                video_info['processed_at'],
+                video_info.get('transcription'),
+                video_info.get('translation'),
+                video_info.get('summary'),
+                video_info.get('subtitle_used', False),
+                _dump_metrics(video_info)
+            ))
+        _write_children(conn, c.lastrowid, video_info)
+        return c.lastrowid
 
+@timed_query
 def get_all_videos(youtube_id=None):
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
+    if youtube_id is None:
+        return list_videos(limit=-1)['videos']
 
-    if youtube_id is not None:
-        c.execute('SELECT * FROM videos WHERE youtube_id = ?', (youtube_id,))
-        row = c.fetchone()
-        if row:
-            video = dict(row)
-            video['screenshots'] = json.loads(video['screenshots'])
-            video['subtitle_used'] = bool(video.get('subtitle_used', False))
-            conn.close()
-            return video
-        else:
-            conn.close()
-            return None
-    else:
-        c.execute(
-            '''SELECT id, youtube_id, title, description, creator, timestamp, duration, language, MAX(processed_at) as processed_at, screenshots, subtitle_used
-                     FROM videos
-                     GROUP BY youtube_id
-                     ORDER BY MAX(processed_at) DESC''')
-        videos = []
-        for row in c.fetchall():
-            video = dict(row)
-            video['screenshots'] = json.loads(video['screenshots'])
-            video['subtitle_used'] = bool(video.get('subtitle_used', False))
-            videos.append(video)
-        conn.close()
-        return videos
+    with connection() as conn:
+        row = conn.execute(
+            '''SELECT id, youtube_id, title, description, creator, timestamp, duration, language, processed_at, transcription, translation, summary, subtitle_used
+               FROM videos WHERE youtube_id = ?''', (youtube_id,)).fetchone()
+    if row is None:
+        return None
 
-def update_video(video_info):
-    conn = sqlite3.connect(DATABASE_NAME)
-    c = conn.cursor()
-    c.execute(
-        '''UPDATE videos
-           SET title = ?, description = ?, creator = ?, timestamp = ?, duration = ?, language = ?, processed_at = ?, screenshots = ?, transcription = ?, translation = ?, summary = ?, subtitle_used = ?
-           WHERE youtube_id = ?''',
-        (
-            video_info['title'],
-            video_info['description'],
-            video_info['creator'],
-            video_info['timestamp'],
-            video_info['duration'],
-            video_info['language'],
-            video_info['processed_at'],
-            json.dumps(video_info['screenshots']),
-            video_info.get('transcription'),
-            video_info.get('translation'),
-            video_info.get('summary'),
-            video_info.get('subtitle_used', False),
-            video_info['youtube_id']))
-    conn.commit()
-    conn.close()
-
-def search_videos(query):
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
+    video = dict(row)
+    video['screenshots'] = get_screenshots(youtube_id)
+    video['subtitle_used'] = bool(video.get('subtitle_used', False))
+    return video
+
+
+LISTING_COLUMNS = ('youtube_id', 'title', 'creator', 'timestamp', 'duration', 'language', 'processed_at',
+                   'subtitle_used')
+
+
+def encode_cursor(video):
+    return f"{video['processed_at']}|{video['id']}"
+
+
+def decode_cursor(cursor):
+    """將分頁游標還原為 (processed_at, id)；格式錯誤時拋出 ValueError。"""
+    processed_at, _, video_id = cursor.rpartition('|')
+    if not processed_at:
+        raise ValueError(f"無效的分頁游標: {cursor}")
+    return processed_at, int(video_id)
 
-    c.execute(
-        '''SELECT id, youtube_id, title, MAX(processed_at) as processed_at, screenshots
-                 FROM videos
-                 WHERE title LIKE ?
-                 GROUP BY youtube_id
-                 ORDER BY MAX(processed_at) DESC''', ('%' + query + '%', ))
+
+@timed_query
+def list_videos(limit=None, cursor=None):
+    """依處理時間由新到舊分頁列出影片，只返回卡片欄位與第一張截圖（thumbnail）。
+
+    以 (processed_at, id) 做 keyset 分頁：cursor 為上一頁返回的 next_cursor，
+    最後一頁的 next_cursor 為 None。limit 為 -1 時返回全部。
+    """
+    limit = PAGE_SIZE if limit is None else limit
+    if limit != -1:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+    sql = f'''SELECT v.id, {', '.join('v.' + column for column in LISTING_COLUMNS)},
+                    (SELECT s.filename FROM screenshots s WHERE s.video_id = v.id ORDER BY s.start LIMIT 1)
+                        AS thumbnail
+             FROM videos v'''
+    params = []
+    if cursor:
+        sql += ' WHERE (v.processed_at, v.id) < (?, ?)'
+        params.extend(decode_cursor(cursor))
+    # 多取一筆以判斷是否還有下一頁
+    sql += ' ORDER BY v.processed_at DESC, v.id DESC LIMIT ?'
+    params.append(limit + 1 if limit != -1 else -1)
+
+    with connection() as conn:
+        rows = conn.execute(sql, params).fetchall()
 
     videos = []
-    for row in c.fetchall():
+    for row in rows[:limit] if limit != -1 else rows:
         video = dict(row)
-        video['screenshots'] = json.loads(video['screenshots'])
-        video['subtitle_used'] = bool(video['subtitle_used'])  # 確保是布爾值
+        video['subtitle_used'] = bool(video['subtitle_used'])
         videos.append(video)
-    conn.close()
+    next_cursor = encode_cursor(videos[-1]) if limit != -1 and len(rows) > limit else None
+    return {'videos': videos, 'next_cursor': next_cursor}
+
+
+@timed_query
+def video_exists(youtube_id):
+    with connection() as conn:
+        return conn.execute('SELECT 1 FROM videos WHERE youtube_id = ?', (youtube_id,)).fetchone() is not None
+
+
+@timed_query
+def get_video_metrics(youtube_id):
+    """返回影片處理時記錄的指標（見 utils.metrics.VideoMetrics），影片不存在時返回 None。"""
+    with connection() as conn:
+        row = conn.execute('SELECT metrics FROM videos WHERE youtube_id = ?', (youtube_id,)).fetchone()
+    if row is None:
+        return None
+    return json.loads(row['metrics']) if row['metrics'] else {}
+
+
+@timed_query
+def get_screenshots(youtube_id):
+    """返回影片的截圖列表（依時間排序），格式與 extract_screenshots 的輸出相同。"""
+    with connection() as conn:
+        rows = conn.execute(
+            '''SELECT s.filename, s.timestamp FROM screenshots s JOIN videos v ON v.id = s.video_id
+               WHERE v.youtube_id = ? ORDER BY s.start''', (youtube_id,)).fetchall()
+    return [dict(row) for row in rows]
+
+
+@timed_query
+def get_cues(youtube_id, track, start=None, end=None):
+    """返回影片某一軌字幕（'transcription' 或 'translation'）的 {'start', 'end', 'text'} 列表，
+    可以 [start, end) 限制開始時間的範圍。"""
+    sql = '''SELECT c.start, c.end, c.text FROM cues c JOIN videos v ON v.id = c.video_id
+             WHERE v.youtube_id = ? AND c.track = ?'''
+    params = [youtube_id, track]
+    if start is not None:
+        sql += ' AND c.start >= ?'
+        params.append(start)
+    if end is not None:
+        sql += ' AND c.start < ?'
+        params.append(end)
+    with connection() as conn:
+        rows = conn.execute(sql + ' ORDER BY c.start', params).fetchall()
+    return [dict(row) for row in rows]
+
+@timed_query
+def update_video(video_info):
+    with transaction() as conn:
+        conn.execute(
+            '''UPDATE videos
+               SET title = ?, description = ?, creator = ?, timestamp = ?, duration = ?, language = ?, processed_at = ?, transcription = ?, translation = ?, summary = ?, subtitle_used = ?, metrics = ?
+               WHERE youtube_id = ?''',
+            (
+                video_info['title'],
+                video_info['description'],
+                video_info['creator'],
+                video_info['timestamp'],
+                video_info['duration'],
+                video_info['language'],
+                video_info['processed_at'],
+                video_info.get('transcription'),
+                video_info.get('translation'),
+                video_info.get('summary'),
+                video_info.get('subtitle_used', False),
+                _dump_metrics(video_info),
+                video_info['youtube_id']))
+        row = conn.execute('SELECT id FROM videos WHERE youtube_id = ?', (video_info['youtube_id'],)).fetchone()
+        if row:
+            _write_children(conn, row['id'], video_info)
+
+def _quote_fts(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _search_terms(query):
+    phrase = ' '.join(query.split())
+    return phrase, phrase.split(' ') if phrase else []
+
+
+def _fts_queries(query):
+    """將使用者輸入轉為候選的 FTS5 查詢，依序嘗試：整句作為片語（trigram 下即子字串比對），
+    再退回各詞 AND。引號避免語法字元被解讀；trigram 無法匹配少於三個字元的詞，含短詞時不產生 AND 查詢，
+    由 _search_like 以 LIKE 比對所有詞。
+    """
+    phrase, terms = _search_terms(query)
+    queries = []
+    if len(phrase) >= 3:
+        queries.append(_quote_fts(phrase))
+    if len(terms) > 1 and all(len(term) >= 3 for term in terms):
+        queries.append(' '.join(_quote_fts(term) for term in terms))
+    return queries
+
+
+def _like_pattern(term):
+    return '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def _like_snippet(text, terms):
+    # 仿照 FTS5 snippet()：以第一個命中處為中心截取約 SNIPPET_TOKENS 個字元，並以 <mark> 標示所有命中的詞
+    pattern = re.compile('|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+    first = pattern.search(text)
+    if first is None:
+        return None
+    begin = max(0, first.start() - SNIPPET_TOKENS // 2)
+    end = min(len(text), begin + max(SNIPPET_TOKENS, first.end() - begin))
+    marked = pattern.sub(lambda match: f'<mark>{match.group(0)}</mark>', text[begin:end])
+    return ('…' if begin else '') + marked + ('…' if end < len(text) else '')
+
+
+def _search_like(conn, terms, limit):
+    """含少於三個字元的詞（如兩個字的中文詞）時，以 LIKE 比對影片欄位與逐句字幕，各詞須同時出現。
+
+    短詞無法使用 trigram 索引，需要掃描整個表；結果不計相關度，影片欄位的命中排在字幕命中之前。
+    """
+    patterns = [_like_pattern(term) for term in terms]
+    video_condition = ' AND '.join(
+        "(title LIKE ? ESCAPE '\\' OR creator LIKE ? ESCAPE '\\' OR summary LIKE ? ESCAPE '\\'"
+        " OR description LIKE ? ESCAPE '\\')" for _ in terms)
+    hits = {}
+    for row in conn.execute(
+            f'''SELECT id, title, creator, summary, description FROM videos WHERE {video_condition}
+                ORDER BY processed_at DESC LIMIT ?''', [p for p in patterns for _ in range(4)] + [limit]):
+        snippets = (_like_snippet(row[column], terms) for column in ('title', 'creator', 'summary', 'description')
+                    if row[column])
+        hits[row['id']] = {'score': 0.0, 'snippet': next(filter(None, snippets), None), 'match': None}
+
+    cue_condition = ' AND '.join("c.text LIKE ? ESCAPE '\\'" for _ in terms)
+    for row in conn.execute(
+            f'''SELECT c.video_id, c.track, c.start, c.text FROM cues c JOIN videos v ON v.id = c.video_id
+                WHERE {cue_condition} ORDER BY v.processed_at DESC, c.start LIMIT ?''',
+            patterns + [limit * SEARCH_CUE_HITS_PER_VIDEO]):
+        hit = hits.setdefault(row['video_id'], {'score': 0.0, 'snippet': None, 'match': None})
+        if hit['match'] is None:
+            hit['match'] = {'track': row['track'], 'start': row['start'], 'snippet': _like_snippet(row['text'], terms)}
+    return hits
+
+
+@timed_query
+def search_videos(query, limit=None):
+    """以全文索引搜尋標題、描述、作者、摘要與逐句字幕，依相關度排序。
+
+    每筆結果包含影片卡片欄位、snippet（以 <mark> 標示命中處）與 match：命中字幕時為
+    {'track', 'start', 'snippet', 'screenshot'}，screenshot 為該句字幕所在的截圖，可直接跳到對應位置。
+    """
+    limit = limit or SEARCH_LIMIT
+    fts_queries = _fts_queries(query)
+    with connection() as conn:
+        hits = {}
+        for fts_query in fts_queries:
+            # bm25 越小越相關；標題的權重最高
+            for row in conn.execute(
+                    '''SELECT rowid, bm25(videos_fts, 10.0, 1.0, 2.0, 3.0) AS score,
+                              snippet(videos_fts, -1, '<mark>', '</mark>', '…', ?) AS snippet
+                       FROM videos_fts WHERE videos_fts MATCH ? ORDER BY score LIMIT ?''',
+                    (SNIPPET_TOKENS, fts_query, limit)):
+                hits[row['rowid']] = {'score': row['score'], 'snippet': row['snippet'], 'match': None}
+            # 每支影片只保留相關度最高的一句字幕
+            for row in conn.execute(
+                    '''SELECT c.video_id, c.track, c.start, bm25(cues_fts) AS score,
+                              snippet(cues_fts, 0, '<mark>', '</mark>', '…', ?) AS snippet
+                       FROM cues_fts JOIN cues c ON c.id = cues_fts.rowid
+                       WHERE cues_fts MATCH ? ORDER BY score LIMIT ?''',
+                    (SNIPPET_TOKENS, fts_query, limit * SEARCH_CUE_HITS_PER_VIDEO)):
+                hit = hits.setdefault(row['video_id'], {'score': row['score'], 'snippet': None, 'match': None})
+                if hit['match'] is None:
+                    hit['score'] = min(hit['score'], row['score'])
+                    hit['match'] = {'track': row['track'], 'start': row['start'], 'snippet': row['snippet']}
+            if hits:
+                break
+        _, terms = _search_terms(query)
+        if not hits and any(len(term) < 3 for term in terms):
+            hits = _search_like(conn, terms, limit)
+
+        ranked = sorted(hits.items(), key=lambda item: item[1]['score'])[:limit]
+        if not ranked:
+            return []
+        placeholders = ', '.join('?' for _ in ranked)
+        rows = conn.execute(
+            f'''SELECT id, youtube_id, title, creator, timestamp, duration, language, processed_at, subtitle_used
+                FROM videos WHERE id IN ({placeholders})''', [video_id for video_id, _ in ranked]).fetchall()
+        videos_by_id = {row['id']: dict(row) for row in rows}
+
+        videos = []
+        for video_id, hit in ranked:
+            video = videos_by_id[video_id]
+            video['subtitle_used'] = bool(video['subtitle_used'])  # 確保是布爾值
+            video['snippet'] = hit['snippet']
+            video['match'] = hit['match']
+            if hit['match'] is not None:
+                screenshot = conn.execute(
+                    '''SELECT filename, timestamp FROM screenshots
+                       WHERE video_id = ? AND start <= ? ORDER BY start DESC LIMIT 1''',
+                    (video_id, hit['match']['start'])).fetchone()
+                hit['match']['screenshot'] = dict(screenshot) if screenshot else None
+            videos.append(video)
     return videos
 
+@timed_query
 def delete_video(youtube_id):
-    conn = sqlite3.connect(DATABASE_NAME)
-    c = conn.cursor()
-    
     try:
         logger.debug(f"開始刪除 youtube_id 為 {youtube_id} 的視頻")
-        
-        # 獲取視頻信息
-        c.execute('SELECT screenshots FROM videos WHERE youtube_id = ?', (youtube_id,))
-        result = c.fetchone()
-        if result:
-            logger.debug(f"找到視頻記錄: {result}")
-            screenshots = json.loads(result[0])
-            
-            # 刪除截圖文件
-            screenshots_dir = 'static/screenshots'
-            logger.debug(f"截圖目錄: {screenshots_dir}")
-            
-            # 使用 glob 查找匹配的文件
-            file_pattern = os.path.join(screenshots_dir, f"{youtube_id}_*.jpg")
-            matching_files = glob.glob(file_pattern)
-            
-            if matching_files:
-                for file_path in matching_files:
-                    logger.debug(f"嘗試刪除文件: {file_path}")
-                    try:
-                        os.remove(file_path)
-                        logger.debug(f"已刪除文件: {file_path}")
-                    except OSError as e:
-                        logger.error(f"刪除文件時發生錯誤: {e}")
-            else:
-                logger.warning(f"未找到匹配的截圖文件: {file_pattern}")
-            
-            # 從數據庫中刪除視頻記錄
-            c.execute('DELETE FROM videos WHERE youtube_id = ?', (youtube_id,))
-            conn.commit()
-            logger.debug(f"已從數據庫中刪除視頻記錄")
-            return True
+
+        with transaction() as conn:
+            # 獲取視頻信息
+            result = conn.execute('SELECT id FROM videos WHERE youtube_id = ?', (youtube_id,)).fetchone()
+            if not result:
+                logger.warning(f"未找到 youtube_id 為 {youtube_id} 的視頻記錄")
+                return False
+            logger.debug(f"找到視頻記錄: {tuple(result)}")
+
+            # 從數據庫中刪除視頻記錄（截圖與字幕子表以 ON DELETE CASCADE 一併刪除）
+            conn.execute('DELETE FROM videos WHERE youtube_id = ?', (youtube_id,))
+        logger.debug(f"已從數據庫中刪除視頻記錄")
+
+        # 刪除截圖文件（在交易提交後進行，不佔用寫入鎖）
+        screenshots_dir = 'static/screenshots'
+        logger.debug(f"截圖目錄: {screenshots_dir}")
+
+        # 使用 glob 查找匹配的文件
+        file_pattern = os.path.join(screenshots_dir, f"{youtube_id}_*.jpg")
+        matching_files = glob.glob(file_pattern)
+
+        if matching_files:
+            for file_path in matching_files:
+                logger.debug(f"嘗試刪除文件: {file_path}")
+                try:
+                    os.remove(file_path)
+                    logger.debug(f"已刪除文件: {file_path}")
+                except OSError as e:
+                    logger.error(f"刪除文件時發生錯誤: {e}")
         else:
-            logger.warning(f"未找到 youtube_id 為 {youtube_id} 的視頻記錄")
-            return False
+            logger.warning(f"未找到匹配的截圖文件: {file_pattern}")
+        return True
     except Exception as e:
         logger.error(f"刪除視頻時發生錯誤: {e}", exc_info=True)
-        conn.rollback()
         return False
-    finally:
-        conn.close()
-        logger.debug("資料庫連接已關閉")
 
 
 
+@timed_query
+def get_checkpoint(youtube_id, stage):
+    """返回階段檢查點的 (fingerprint, output)，沒有記錄時返回 None。"""
+    with connection() as conn:
+        row = conn.execute('SELECT fingerprint, output FROM checkpoints WHERE youtube_id = ? AND stage = ?',
+                           (youtube_id, stage)).fetchone()
+    return (row['fingerprint'], json.loads(row['output'])) if row else None
+
+
+@timed_query
+def save_checkpoint(youtube_id, stage, fingerprint, output):
+    with transaction() as conn:
+        conn.execute(
+            '''INSERT OR REPLACE INTO checkpoints (youtube_id, stage, fingerprint, output, updated_at)
+               VALUES (?, ?, ?, ?, ?)''',
+            (youtube_id, stage, fingerprint, json.dumps(output, ensure_ascii=False), datetime.now().isoformat()))
+
+
+@timed_query
+def delete_checkpoints(youtube_id):
+    with transaction() as conn:
+        conn.execute('DELETE FROM checkpoints WHERE youtube_id = ?', (youtube_id,))
+
+
 def dump_database():
-    conn = sqlite3.connect(DATABASE_NAME)
-    c = conn.cursor()
-    c.execute('SELECT * FROM videos')
-    rows = c.fetchall()
-    conn.close()
-    return rows
+    with connection() as conn:
+        return [tuple(row) for row in conn.execute('SELECT * FROM videos')]
+
+
+JOB_FIELDS = ('status', 'stage', 'progress', 'error', 'youtube_id')
+
+
+def _job_from_row(row):
+    job = dict(row)
+    job['params'] = json.loads(job['params']) if job['params'] else {}
+    return job
+
+
+@timed_query
+def create_job(job_id, youtube_url, params):
+    now = datetime.now().isoformat()
+    with transaction() as conn:
+        conn.execute(
+            '''INSERT INTO jobs (id, youtube_url, params, status, stage, progress, created_at, updated_at)
+               VALUES (?, ?, ?, 'queued', 'queued', 0, ?, ?)''',
+            (job_id, youtube_url, json.dumps(params), now, now))
+
+
+@timed_query
+def update_job(job_id, **fields):
+    unknown = set(fields) - set(JOB_FIELDS)
+    if unknown:
+        raise ValueError(f"未知的任務欄位: {unknown}")
+    fields['updated_at'] = datetime.now().isoformat()
+    assignments = ', '.join(f"{name} = ?" for name in fields)
+    with transaction() as conn:
+        conn.execute(f'UPDATE jobs SET {assignments} WHERE id = ?', (*fields.values(), job_id))
+
+
+@timed_query
+def get_job(job_id):
+    with connection() as conn:
+        row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    return _job_from_row(row) if row else None
+
+
+@timed_query
+def list_jobs(status=None, limit=50):
+    with connection() as conn:
+        if status is not None:
+            rows = conn.execute('SELECT * FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?',
+                                (status, limit)).fetchall()
+        else:
+            rows = conn.execute('SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?', (limit,)).fetchall()
+    return [_job_from_row(row) for row in rows]
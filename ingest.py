@@ -0,0 +1,175 @@
+"""批次處理影片：展開播放清單與頻道，略過資料庫中已有的影片，並行處理其餘影片。
+
+用法:
+    python ingest.py https://www.youtube.com/@channel/videos https://www.youtube.com/playlist?list=...
+    python ingest.py --file urls.txt --workers 2 --force
+"""
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import yt_dlp
+from database import init_db, video_exists, transaction
+from job_queue import save_video_result
+from utils.video_processor import process_video
+from utils.vtt_translator import get_request_count
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+OUTPUT_FOLDER = 'static/screenshots'
+INGEST_WORKERS = 2  # 同時處理的影片數
+WRITE_BATCH_SIZE = 10  # 累積多少支影片的結果後以單一交易寫入資料庫
+VIDEO_URL = 'https://www.youtube.com/watch?v={id}'
+
+
+def expand_url(url, ydl):
+    """以 yt-dlp 的 flat 擷取展開播放清單或頻道（含頻道的各分頁），產生 (youtube_id, 影片網址)。"""
+    info = ydl.extract_info(url, download=False)
+    yield from _expand_entry(info, ydl)
+
+
+def _expand_entry(info, ydl):
+    if info.get('_type') in ('playlist', 'multi_video'):
+        for entry in info.get('entries') or []:
+            if entry:
+                yield from _expand_entry(entry, ydl)
+    elif info.get('_type') == 'url' and info.get('ie_key') != 'Youtube':
+        # 頻道首頁的 flat 結果是各分頁（影片、Shorts、直播）的網址，需要再展開一層
+        yield from expand_url(info['url'], ydl)
+    elif info.get('id'):
+        yield info['id'], info.get('webpage_url') or info.get('url') or VIDEO_URL.format(id=info['id'])
+
+
+def collect_videos(urls, force=False):
+    """展開所有網址並去除重複；force=False 時略過資料庫中已有的影片。返回 ([(youtube_id, 網址)], 略過數)。"""
+    videos = {}
+    with yt_dlp.YoutubeDL({'quiet': True, 'extract_flat': 'in_playlist'}) as ydl:
+        for url in urls:
+            try:
+                found = list(expand_url(url, ydl))
+            except yt_dlp.utils.DownloadError as e:
+                logger.error(f"無法展開 {url}: {e}")
+                continue
+            logger.info(f"{url}: {len(found)} 支影片")
+            for youtube_id, video_url in found:
+                videos.setdefault(youtube_id, video_url)
+
+    pending = [(youtube_id, video_url) for youtube_id, video_url in videos.items()
+               if force or not video_exists(youtube_id)]
+    return pending, len(videos) - len(pending)
+
+
+def write_batch(results):
+    """以單一交易寫入一批處理結果（add_video / update_video 的交易會併入外層交易）。"""
+    if not results:
+        return
+    with transaction():
+        for video_info in results:
+            save_video_result(video_info)
+    logger.info(f"已寫入 {len(results)} 支影片")
+    results.clear()
+
+
+def ingest(urls, force=False, workers=None, batch_size=None, **params):
+    """批次處理影片並返回統計；params 傳給 process_video（capture_interval、sampling_mode 等）。"""
+    workers = workers or INGEST_WORKERS
+    batch_size = batch_size or WRITE_BATCH_SIZE
+    params.setdefault('output_folder', OUTPUT_FOLDER)
+
+    pending, skipped = collect_videos(urls, force)
+    logger.info(f"待處理 {len(pending)} 支影片，略過已存在的 {skipped} 支")
+
+    start = time.perf_counter()
+    start_requests = get_request_count()
+    processed, failed, video_seconds = 0, [], 0.0
+    batch = []
+
+    def collect(youtube_id, video_info):
+        nonlocal processed, video_seconds
+        if 'error' in video_info:
+            logger.error(f"處理失敗 {youtube_id}: {video_info['error']}")
+            failed.append(youtube_id)
+            return
+        processed += 1
+        video_seconds += video_info['timings']['total']
+        batch.append(video_info)
+
+    # 不使用 with：離開 with 區塊時會等待所有排隊中的影片處理完，中斷（Ctrl-C）或出錯時無法停止
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ingest')
+    futures = {executor.submit(process_video, video_url, **params): youtube_id
+               for youtube_id, video_url in pending}
+    try:
+        # 結果只在主執行緒寫入，處理中的影片不會互相等待資料庫的寫入鎖
+        for future in as_completed(futures):
+            collect(futures.pop(future), future.result())
+            if len(batch) >= batch_size:
+                write_batch(batch)
+    except BaseException:
+        # 取消尚未開始的影片，不等待處理中的影片；已完成但尚未取出的結果與 batch 一併在下方寫入
+        logger.warning("批次處理中斷，取消尚未開始的影片")
+        executor.shutdown(wait=False, cancel_futures=True)
+        for future, youtube_id in futures.items():
+            if future.done() and not future.cancelled() and future.exception() is None:
+                collect(youtube_id, future.result())
+        raise
+    finally:
+        # 尚未完成的影片重跑時可沿用階段檢查點
+        write_batch(batch)
+    executor.shutdown()
+
+    elapsed = time.perf_counter() - start
+    llm_calls = get_request_count() - start_requests
+    return {
+        'processed': processed,
+        'failed': failed,
+        'skipped': skipped,
+        'elapsed': elapsed,
+        'videos_per_hour': processed / elapsed * 3600 if elapsed else 0.0,
+        'llm_calls': llm_calls,
+        'llm_calls_per_video': llm_calls / processed if processed else 0.0,
+        'seconds_per_video': video_seconds / processed if processed else 0.0,
+    }
+
+
+def read_url_file(path):
+    """讀取網址清單檔，每行一個網址，忽略空行與 # 開頭的註解。"""
+    with open(path, 'r', encoding='utf-8') as file:
+        return [line.strip() for line in file if line.strip() and not line.lstrip().startswith('#')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('urls', nargs='*', help='影片、播放清單或頻道網址')
+    parser.add_argument('--file', help='網址清單檔（每行一個）')
+    parser.add_argument('--force', action='store_true', help='重新處理資料庫中已有的影片')
+    parser.add_argument('--workers', type=int, default=INGEST_WORKERS, help='同時處理的影片數')
+    parser.add_argument('--batch-size', type=int, default=WRITE_BATCH_SIZE, help='每次交易寫入的影片數')
+    parser.add_argument('--capture-interval', type=int, default=10, help='截圖間隔（秒）')
+    parser.add_argument('--sampling-mode', help='截圖取樣模式（見 utils.frame_sampler.SAMPLING_MODES）')
+    parser.add_argument('--adjacent-only', action='store_true', help='截圖只與上一張保留的截圖比較去重複')
+    parser.add_argument('--no-screenshots', action='store_true', help='不擷取截圖')
+    args = parser.parse_args()
+
+    urls = args.urls + (read_url_file(args.file) if args.file else [])
+    if not urls:
+        parser.error('請提供至少一個網址或 --file')
+
+    init_db()
+    stats = ingest(urls, force=args.force, workers=args.workers, batch_size=args.batch_size,
+                   capture_interval=args.capture_interval, sampling_mode=args.sampling_mode,
+                   adjacent_only=args.adjacent_only,
+                   capture_screenshots=not args.no_screenshots)
+
+    print(f"完成 {stats['processed']} 支，失敗 {len(stats['failed'])} 支，略過 {stats['skipped']} 支，"
+          f"總耗時 {stats['elapsed']:.1f} 秒")
+    print(f"吞吐量: {stats['videos_per_hour']:.1f} 支/小時")
+    print(f"每支影片: {stats['seconds_per_video']:.1f} 秒，{stats['llm_calls_per_video']:.1f} 次模型請求"
+          f"（共 {stats['llm_calls']} 次）")
+    if stats['failed']:
+        print(f"失敗的影片: {', '.join(stats['failed'])}")
+
+
+if __name__ == '__main__':
+    main()
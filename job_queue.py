@@ -0,0 +1,174 @@
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from utils.video_processor import process_video
+from utils.workspace import clear_scratch
+from database import create_job, update_job, get_job, list_jobs, video_exists, add_video, update_video
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# 同時處理的影片數（每個任務使用獨立的暫存目錄，可安全並行）
+JOB_WORKERS = 2
+# 重新啟動時，中斷的 running 任務重新排入佇列（False 則標記為失敗）
+RESUME_INTERRUPTED_JOBS = True
+
+# 記憶體中保留事件記錄的已結束任務數（進行中任務的記錄不會被移除）
+EVENT_HISTORY_JOBS = 20
+# SSE 連線在沒有新事件時，每隔多少秒送出心跳
+EVENT_HEARTBEAT_SECONDS = 15
+# 階段不變時，進度至少前進多少才寫入資料庫（逐批翻譯進度只需即時推送給 SSE 串流）
+PROGRESS_PERSIST_STEP = 5
+
+_executor = None
+_start_lock = threading.Lock()
+
+# 任務 ID → {'events': [...], 'closed': bool}；新事件以 Condition 通知等待中的串流
+_event_logs = OrderedDict()
+_events_changed = threading.Condition()
+
+
+def start():
+    """啟動工作執行緒池並恢復上次未完成的任務；重複呼叫不會有副作用。"""
+    global _executor
+    with _start_lock:
+        if _executor is not None:
+            return
+        _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='video-job')
+        # 上次執行遺留的暫存目錄已無任務使用，先行清除
+        clear_scratch()
+        resume_jobs()
+
+
+def resume_jobs():
+    for job in reversed(list_jobs(status='running', limit=-1)):
+        if RESUME_INTERRUPTED_JOBS:
+            logger.info(f"重新排入中斷的任務: {job['id']}")
+            update_job(job['id'], status='queued', stage='queued', progress=0)
+            open_event_log(job['id'])
+            _executor.submit(_run_job, job['id'])
+        else:
+            update_job(job['id'], status='failed', error='服務重新啟動，任務已中斷')
+
+    for job in reversed(list_jobs(status='queued', limit=-1)):
+        logger.info(f"恢復排隊中的任務: {job['id']}")
+        open_event_log(job['id'])
+        _executor.submit(_run_job, job['id'])
+
+
+def open_event_log(job_id):
+    with _events_changed:
+        _event_logs[job_id] = {'events': [], 'closed': False}
+        finished = [key for key, log in _event_logs.items() if log['closed']]
+        for key in finished[:max(0, len(finished) - EVENT_HISTORY_JOBS)]:
+            del _event_logs[key]
+
+
+def publish_event(job_id, event, close=False):
+    """記錄任務事件並喚醒等待中的串流；close=True 表示任務已結束，不會再有新事件。"""
+    with _events_changed:
+        log = _event_logs.get(job_id)
+        if log is None or log['closed']:
+            return
+        log['events'].append(event)
+        log['closed'] = close
+        _events_changed.notify_all()
+
+
+def has_event_log(job_id):
+    with _events_changed:
+        return job_id in _event_logs
+
+
+def iter_events(job_id, start=0, heartbeat=None):
+    """依序產生 (序號, 事件)，從 start 開始並等待後續事件，任務結束後停止。
+
+    超過 heartbeat 秒沒有新事件時產生 None，讓呼叫端送出心跳以維持連線。
+    """
+    heartbeat = heartbeat or EVENT_HEARTBEAT_SECONDS
+    position = start
+    while True:
+        with _events_changed:
+            log = _event_logs.get(job_id)
+            if log is None:
+                return
+            if position >= len(log['events']) and not log['closed']:
+                _events_changed.wait(heartbeat)
+            pending = log['events'][position:]
+            closed = log['closed']
+        for event in pending:
+            yield position, event
+            position += 1
+        if closed and not pending:
+            return
+        if not pending:
+            yield None
+
+
+def submit_job(youtube_url, params):
+    """建立任務並排入佇列，立即返回任務 ID。"""
+    start()
+    job_id = uuid.uuid4().hex
+    create_job(job_id, youtube_url, params)
+    open_event_log(job_id)
+    _executor.submit(_run_job, job_id)
+    logger.info(f"已建立任務 {job_id}: {youtube_url}")
+    return job_id
+
+
+def save_video_result(video_info):
+    """將處理結果寫入資料庫（已存在則更新）。"""
+    video_info['subtitle_used'] = bool(video_info.get('subtitle_used', False))
+    if video_info['subtitle_used']:
+        logger.info("使用字幕檔案進行翻譯與摘要")
+    else:
+        logger.info("使用聲音檔案進行轉錄/翻譯與摘要")
+    logger.info(f"Translation: {video_info.get('translation', 'Not found')[:100]}...")
+    logger.info(f"Summary: {video_info.get('summary', 'Not found')[:100]}...")
+
+    if video_exists(video_info['youtube_id']):
+        update_video(video_info)
+    else:
+        add_video(video_info)
+
+
+def _run_job(job_id):
+    job = get_job(job_id)
+    if job is None or job['status'] != 'queued':
+        return
+
+    persisted = {'stage': None, 'progress': 0}
+    persist_lock = threading.Lock()  # 兩個處理分支的執行緒都會送出事件
+
+    def handle_event(event):
+        # 階段改變或進度前進足夠時才寫入資料庫供 /jobs 查詢，完整事件則一律推送給 SSE 串流
+        fields = {key: event[key] for key in ('stage', 'progress') if key in event}
+        with persist_lock:
+            if ('stage' in fields and fields['stage'] != persisted['stage']) or \
+                    fields.get('progress', persisted['progress']) - persisted['progress'] >= PROGRESS_PERSIST_STEP:
+                update_job(job_id, **fields)
+                persisted.update(fields)
+        publish_event(job_id, event)
+
+    update_job(job_id, status='running')
+    handle_event({'type': 'stage', 'stage': 'starting', 'progress': 0})
+
+    try:
+        video_info = process_video(job['youtube_url'], progress_callback=handle_event, **job['params'])
+        if 'error' in video_info:
+            update_job(job_id, status='failed', error=video_info['error'],
+                       youtube_id=video_info.get('youtube_id'))
+            publish_event(job_id, {'type': 'failed', 'error': video_info['error']}, close=True)
+            return
+        handle_event({'type': 'stage', 'stage': 'saving', 'progress': 99})
+        save_video_result(video_info)
+        update_job(job_id, status='completed', stage='completed', progress=100, youtube_id=video_info['youtube_id'])
+        publish_event(job_id, {'type': 'completed', 'youtube_id': video_info['youtube_id']}, close=True)
+        logger.info(f"任務完成 {job_id}: {video_info['youtube_id']}")
+    except Exception as e:
+        logger.error(f"任務 {job_id} 發生錯誤: {str(e)}", exc_info=True)
+        update_job(job_id, status='failed', error=str(e))
+        publish_event(job_id, {'type': 'failed', 'error': str(e)}, close=True)
@@ -1,11 +1,15 @@
 import os
+import json
 import logging
-from flask import Flask, render_template, request, jsonify
-from utils.video_processor import process_video # 確保導入所需函數
+from flask import Flask, render_template, request, jsonify, redirect, url_for, Response, stream_with_context
 import sqlite3
-from database import init_db, get_all_videos, add_video, update_video, dump_database, search_videos, delete_video
-from datetime import datetime,  timedelta
-import re
+from database import init_db, get_all_videos, list_videos, dump_database, search_videos, delete_video, get_job, list_jobs, get_video_metrics
+import job_queue
+from utils.pairing import load_paired_data
+from utils.checkpoints import clear_checkpoints
+from utils import metrics
+from utils.workspace import clear_scratch
+from datetime import datetime
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'static/screenshots'
@@ -21,29 +25,39 @@ os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 init_db()
 
 
+@app.before_request
+def start_job_queue():
+    # 在第一個請求時才啟動任務佇列，避免 debug 模式的重載器父進程重複恢復任務
+    job_queue.start()
+
+
 @app.route('/clear_temp_files', methods=['POST'])
 def clear_temp_files():
-    # 删除临时视频文件
-    if os.path.exists('temp_video.mp4'):
-        os.remove('temp_video.mp4')
-    if os.path.exists('temp_audio.mp3'):
-        os.remove('temp_audio.mp3')
+    # 删除临时视频文件（进行中任务的暂存目录会被保留）
+    removed = clear_scratch()
     return jsonify({
         'status': 'success',
-        'message': 'Temporary files cleared.'
+        'message': f'Temporary files cleared ({removed} entries).'
     }), 200
 
 
 @app.route('/')
 def index():
-    videos = get_all_videos()
-    return render_template('index.html', videos=videos)
+    try:
+        page = list_videos(cursor=request.args.get('cursor'))
+    except ValueError:
+        page = list_videos()
+    return render_template('index.html', videos=page['videos'], next_cursor=page['next_cursor'])
 
 
 @app.route('/api/videos', methods=['GET'])
 def get_videos():
-    videos = get_all_videos()  # 获取视频列表
-    return jsonify(videos)  # 返回 JSON 格式的视频
+    # 分頁返回视频列表：{'videos': [...], 'next_cursor': ...}，以 ?cursor= 取得下一頁
+    try:
+        page = list_videos(limit=request.args.get('limit', type=int), cursor=request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 400
+    return jsonify(page)
 
 
 
@@ -62,67 +76,125 @@ def video_screenshots(youtube_id):
 def process_video_route():
     youtube_url = request.form.get('youtube_url')
     capture_interval = int(request.form.get('capture_interval', 10))
+    sampling_mode = request.form.get('sampling_mode')
+    min_scene_gap = request.form.get('min_scene_gap', type=float)
+    adjacent_only = request.form.get('adjacent_only', 'false').lower() == 'true'
+    capture_screenshots = request.form.get('capture_screenshots', 'true').lower() != 'false'
+    max_height = request.form.get('max_height', type=int)
     if not youtube_url:
         return jsonify({'error': 'No YouTube URL provided'}), 400
-    try:
-        video_info = process_video(youtube_url, app.config['UPLOAD_FOLDER'], capture_interval)
-        
-        # Check if subtitles were used
-        subtitle_used = 'subtitle_used' in video_info and video_info['subtitle_used']
-
-        app.logger.info(f"Subtitle used: {video_info.get('subtitle_used', False)}")
-        
-        if subtitle_used:
-            # If subtitles were used
-            video_info['subtitle_used'] = True
-            logging.info("使用字幕檔案進行翻譯與摘要")
-            existing_video = get_all_videos(youtube_id=video_info['youtube_id'])
-            
-            app.logger.info(f"Translation: {video_info.get('translation', 'Not found')[:100]}...")
-            app.logger.info(f"Summary: {video_info.get('summary', 'Not found')[:100]}...")
-           
-            if existing_video:
-                update_video(video_info)
+
+    # 影片處理可能耗時數十分鐘，交由背景任務執行，立即返回任務 ID
+    job_id = job_queue.submit_job(youtube_url, {
+        'output_folder': app.config['UPLOAD_FOLDER'],
+        'capture_interval': capture_interval,
+        'sampling_mode': sampling_mode,
+        'min_scene_gap': min_scene_gap,
+        'adjacent_only': adjacent_only,
+        'capture_screenshots': capture_screenshots,
+        'max_height': max_height
+    })
+    return jsonify({
+        'status': 'queued',
+        'message': 'Video queued for processing.',
+        'job_id': job_id
+    }), 202
+
+
+@app.route('/jobs')
+def jobs_route():
+    status = request.args.get('status')
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify(list_jobs(status=status, limit=limit))
+
+
+@app.route('/jobs/<string:job_id>')
+def job_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'error': 'Job not found'}), 404
+    return jsonify(job)
+
+
+def format_sse(event, event_id=None):
+    lines = f"id: {event_id}\n" if event_id is not None else ''
+    return lines + f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+@app.route('/jobs/<string:job_id>/events')
+def job_events(job_id):
+    """以 Server-Sent Events 推送任務事件：階段切換、N/M 條字幕已翻譯（含部分翻譯）、截圖、摘要與完成。"""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'error': 'Job not found'}), 404
+
+    # EventSource 重新連線時以 Last-Event-ID 告知最後收到的事件，從下一筆繼續
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    start = last_event_id + 1 if last_event_id is not None else request.args.get('since', 0, type=int)
+
+    def generate():
+        if not job_queue.has_event_log(job_id):
+            # 事件記錄已不在記憶體中（例如服務重新啟動），只送出目前狀態
+            if job['status'] == 'completed':
+                yield format_sse({'type': 'completed', 'youtube_id': job['youtube_id']})
+            elif job['status'] == 'failed':
+                yield format_sse({'type': 'failed', 'error': job['error']})
             else:
-                add_video(video_info)
-            return jsonify({
-                'status': 'success',
-                'message': 'Video processed with subtitles.',
-                'video_info': video_info
-            }), 200
-        else:
-            # If subtitles were not used
-            video_info['subtitle_used'] = False
-            logging.info("使用聲音檔案進行轉錄/翻譯與摘要")
-            existing_video = get_all_videos(youtube_id=video_info['youtube_id'])
-
-            app.logger.info(f"Translation: {video_info.get('translation', 'Not found')[:100]}...")
-            app.logger.info(f"Summary: {video_info.get('summary', 'Not found')[:100]}...")
-
-            if existing_video:
-                update_video(video_info)
+                yield format_sse({'type': 'stage', 'stage': job['stage'], 'progress': job['progress']})
+            return
+        for item in job_queue.iter_events(job_id, start):
+            if item is None:
+                yield ': keep-alive\n\n'
             else:
-                add_video(video_info)
-            return jsonify({
-                'status': 'success',
-                'message': 'Video processed without YouTube subtitles.',
-                'video_info': video_info
-            }), 200
-
-    except Exception as e:
-        app.logger.error(f"Error processing video: {str(e)}")
-        return jsonify({'status': 'error', 'error': str(e)}), 500
-    
-
+                yield format_sse(item[1], item[0])
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/jobs/<string:job_id>/live')
+def job_live(job_id):
+    """在任務完成前即以 video_screenshots.html 顯示部分結果，由頁面訂閱事件串流逐步填入。"""
+    job = get_job(job_id)
+    if job is None:
+        return "Job not found", 404
+    if job['status'] == 'completed':
+        return redirect(url_for('video_screenshots', youtube_id=job['youtube_id']))
+    video = {
+        'title': '處理中...',
+        'youtube_id': '',
+        'processed_at': job['created_at'],
+        'screenshots': [],
+        'summary': '',
+        'translation': '',
+        'transcription': '',
+    }
+    return render_template('video_screenshots.html', video=video, paired_data=[], job_id=job_id)
 
 
 @app.route('/search')
 def search():
+    # 依相關度返回影片；命中字幕時 match 含時間、摘錄與對應的截圖，可連結到 /video/<id>#screenshot-<timestamp>
     query = request.args.get('q', '')
-    videos = search_videos(query)
+    videos = search_videos(query, limit=request.args.get('limit', type=int))
     return jsonify(videos)
 
 
+@app.route('/api/videos/<string:youtube_id>/metrics')
+def video_metrics(youtube_id):
+    # 該影片處理時的各階段耗時、模型請求與 token 數、去重複前後的截圖數與資料庫耗時
+    video_metrics = get_video_metrics(youtube_id)
+    if video_metrics is None:
+        return jsonify({'error': 'Video not found'}), 404
+    return jsonify(video_metrics)
+
+
+@app.route('/metrics')
+def metrics_route():
+    # Prometheus 文字格式，供抓取程序定期讀取
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 @app.route('/debug/db')
 def debug_db():
     app.logger.info(f"Database contents: {dump_database()}")
@@ -134,6 +206,7 @@ def delete_video_route(youtube_id):
     logger.debug(f"收到刪除 youtube_id 為 {youtube_id} 的視頻請求")
     success = delete_video(youtube_id)
     if success:
+        clear_checkpoints(youtube_id)
         logger.info(f"成功刪除 youtube_id 為 {youtube_id} 的視頻")
         return jsonify({
             "status": "success",
@@ -149,62 +222,8 @@ def delete_video_route(youtube_id):
 
 
 def process_video_data(video_info):
-    screenshots = video_info['screenshots']
-    translation = video_info.get('translation', '')
-    transcription = video_info.get('transcription', '')
-    
-    # 解析翻譯後的字幕
-    translated_parts = re.findall(r'(\d{2}:\d{2}:\d{2}\.\d{3}) --> (\d{2}:\d{2}:\d{2}\.\d{3})\n(.*?)(?:\n\n|$)', translation, re.DOTALL)
-    
-    # 解析原始字幕
-    original_parts = re.findall(r'(\d{2}:\d{2}:\d{2}\.\d{3}) --> (\d{2}:\d{2}:\d{2}\.\d{3})\n(.*?)(?:\n\n|$)', transcription, re.DOTALL)
-    
-    # 將字幕轉換為更易於處理的格式
-    translated_subtitles = [
-        {
-            'start': timestamp_to_seconds(start),
-            'end': timestamp_to_seconds(end),
-            'text': text.strip()
-        }
-        for start, end, text in translated_parts
-    ]
-    
-    original_subtitles = [
-        {
-            'start': timestamp_to_seconds(start),
-            'end': timestamp_to_seconds(end),
-            'text': text.strip()
-        }
-        for start, end, text in original_parts
-    ]
-    
-    # 將截圖與字幕配對
-    paired_data = []
-    for i, screenshot in enumerate(screenshots):
-        current_time = float(screenshot['timestamp'].replace('s', ''))
-        next_time = float(screenshots[i+1]['timestamp'].replace('s', '')) if i+1 < len(screenshots) else float('inf')
-        
-        matching_translated = find_matching_subtitles(current_time, next_time, translated_subtitles)
-        matching_original = find_matching_subtitles(current_time, next_time, original_subtitles)
-        
-        paired_data.append({
-            'screenshot': screenshot,
-            'translated_subtitles': matching_translated,
-            'original_subtitles': matching_original
-        })
-    
-    return paired_data
-
-def timestamp_to_seconds(timestamp):
-    t = datetime.strptime(timestamp, '%H:%M:%S.%f')
-    return timedelta(hours=t.hour, minutes=t.minute, seconds=t.second, microseconds=t.microsecond).total_seconds()
-
-def find_matching_subtitles(current_time, next_time, subtitles):
-    matching_subtitles = []
-    for subtitle in subtitles:
-        if current_time <= subtitle['start'] < next_time:
-            matching_subtitles.append(subtitle)
-    return matching_subtitles
+    # 配對結果依影片快取，重複瀏覽同一影片不必重新讀取字幕
+    return load_paired_data(video_info['youtube_id'], video_info['processed_at'])
 
 
 def datetime_format(value, format='%Y-%m-%d %H:%M:%S'):
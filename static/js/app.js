@@ -29,16 +29,12 @@ document.addEventListener('DOMContentLoaded', () => {
                 if (response.ok) {
                     const result = await response.json();
                     console.log('Server response:', result);
-                    if (result.status === 'success') {
-                        if (message) message.textContent = '視頻處理成功！';
-                        // 更新視頻列表
-                        try {
-                            const updatedVideos = await fetch('/api/videos');
-                            const videoData = await updatedVideos.json();
-                            updateVideoTable(videoData);
-                        } catch (error) {
-                            console.error('更新視頻列表時發生錯誤:', error);
-                            if (message) message.textContent = '視頻處理成功，但更新列表失敗。';
+                    if (result.status === 'queued') {
+                        if (message) message.textContent = '視頻已加入處理佇列...';
+                        if (window.EventSource) {
+                            watchJob(result.job_id);
+                        } else {
+                            pollJob(result.job_id);
                         }
                     } else {
                         if (message) message.textContent = result.message || '處理視頻時發生錯誤。';
@@ -56,6 +52,108 @@ document.addEventListener('DOMContentLoaded', () => {
         console.warn('未找到視頻表單元素');
     }
 
+    async function refreshVideoTable() {
+        if (message) message.textContent = '視頻處理成功！';
+        try {
+            const updatedVideos = await fetch('/api/videos');
+            const videoData = await updatedVideos.json();
+            updateVideoTable(videoData.videos);
+        } catch (error) {
+            console.error('更新視頻列表時發生錯誤:', error);
+            if (message) message.textContent = '視頻處理成功，但更新列表失敗。';
+        }
+    }
+
+    // 訂閱背景任務的事件串流，即時顯示進度，完成後更新視頻列表
+    function watchJob(jobId) {
+        const liveLink = `<a href="/jobs/${jobId}/live" target="_blank">查看即時結果</a>`;
+        const source = new EventSource(`/jobs/${jobId}/events`);
+        source.onmessage = (e) => {
+            const event = JSON.parse(e.data);
+            if (event.type === 'stage') {
+                if (message) message.innerHTML = `正在處理視頻... ${event.stage} (${Math.round(event.progress)}%) ${liveLink}`;
+            } else if (event.type === 'cues') {
+                if (message) message.innerHTML = `正在翻譯... ${event.done}/${event.total} 條字幕 ${liveLink}`;
+            } else if (event.type === 'completed') {
+                source.close();
+                refreshVideoTable();
+            } else if (event.type === 'failed') {
+                source.close();
+                if (message) message.textContent = `錯誤: ${event.error || '處理視頻時發生錯誤。'}`;
+            }
+        };
+    }
+
+    // 輪詢背景任務狀態，完成後更新視頻列表（瀏覽器不支援 EventSource 時使用）
+    function pollJob(jobId) {
+        const timer = setInterval(async () => {
+            try {
+                const response = await fetch(`/jobs/${jobId}`);
+                const job = await response.json();
+                if (job.status === 'completed') {
+                    clearInterval(timer);
+                    refreshVideoTable();
+                } else if (job.status === 'failed') {
+                    clearInterval(timer);
+                    if (message) message.textContent = `錯誤: ${job.error || '處理視頻時發生錯誤。'}`;
+                } else if (message) {
+                    message.textContent = `正在處理視頻... ${job.stage} (${Math.round(job.progress)}%)`;
+                }
+            } catch (error) {
+                console.error('查詢任務狀態時發生錯誤:', error);
+            }
+        }, 2000);
+    }
+
+    if (searchForm) {
+        searchForm.addEventListener('submit', async (e) => {
+            e.preventDefault();
+            const resultContainer = document.getElementById('resultContainer');
+            const query = searchQuery ? searchQuery.value.trim() : '';
+            if (!query || !resultContainer) return;
+            try {
+                const response = await fetch(`/search?q=${encodeURIComponent(query)}`);
+                renderSearchResults(resultContainer, await response.json());
+            } catch (error) {
+                console.error('搜尋時發生錯誤:', error);
+                resultContainer.textContent = '搜尋時發生錯誤。';
+            }
+        });
+    }
+
+    // 摘錄中除了伺服器標示命中處的 <mark> 以外一律轉義
+    function highlightSnippet(snippet) {
+        const escaped = snippet.replace(/[&<>"']/g, c => ({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[c]));
+        return escaped.replace(/&lt;mark&gt;/g, '<mark>').replace(/&lt;\/mark&gt;/g, '</mark>');
+    }
+
+    function renderSearchResults(container, videos) {
+        container.innerHTML = '';
+        if (!Array.isArray(videos) || videos.length === 0) {
+            container.textContent = '沒有找到視頻。';
+            return;
+        }
+        const list = document.createElement('ul');
+        videos.forEach(video => {
+            const item = document.createElement('li');
+            const link = document.createElement('a');
+            // 命中字幕時直接跳到該句所在的截圖
+            const screenshot = video.match && video.match.screenshot;
+            link.href = `/video/${video.youtube_id}` + (screenshot ? `#screenshot-${screenshot.timestamp}` : '');
+            link.textContent = video.title;
+            item.appendChild(link);
+            const snippet = video.match ? video.match.snippet : video.snippet;
+            if (snippet) {
+                const detail = document.createElement('div');
+                const time = video.match ? `[${Math.floor(video.match.start / 60)}:${String(Math.floor(video.match.start % 60)).padStart(2, '0')}] ` : '';
+                detail.innerHTML = time + highlightSnippet(snippet);
+                item.appendChild(detail);
+            }
+            list.appendChild(item);
+        });
+        container.appendChild(list);
+    }
+
     if (videoTable) {
         videoTable.addEventListener('click', async (e) => {
             if (e.target.closest('.delete-btn')) {
@@ -106,7 +204,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 videos.forEach(video => {
                     const row = document.createElement('tr');
                     row.innerHTML = `
-                        <td><a href="/video/${video.youtube_id}">${video.title}</a></td>
+                        <td><a href="/video/${video.youtube_id}">${video.thumbnail ? `<img src="/static/screenshots/${video.thumbnail}" alt="" class="thumbnail" loading="lazy">` : ''}${video.title}</a></td>
                         <td>${video.creator || 'Unknown'}</td>
                         <td>${video.timestamp ? new Date(video.timestamp).toLocaleString() : ''}</td>
                         <td>${video.duration || ''}</td>
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+from utils import transcriber
+from utils.audio import SAMPLE_RATE
+
+
+def make_pcm(seconds, silences=()):
+    """產生 seconds 秒的雜訊，silences 中的 (起, 訖) 秒數範圍為靜音。"""
+    samples = np.random.default_rng(0).uniform(-0.5, 0.5, int(seconds * SAMPLE_RATE)).astype(np.float32)
+    for start, end in silences:
+        samples[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)] = 0
+    return samples
+
+
+@pytest.fixture
+def fake_audio(monkeypatch):
+    """以合成的 PCM 取代 ffmpeg 解碼，iter_audio_chunks 依要求的視窗長度切分。"""
+    def use(samples):
+        def iter_audio_chunks(audio_path, chunk_seconds=None):
+            size = int(chunk_seconds * SAMPLE_RATE)
+            for start in range(0, len(samples), size):
+                yield start / SAMPLE_RATE, samples[start:start + size]
+        monkeypatch.setattr(transcriber, 'iter_audio_chunks', iter_audio_chunks)
+    return use
+
+
+def test_get_transcriber_selects_and_reuses_backend():
+    stub = transcriber.get_transcriber('stub', 'tiny')
+    assert isinstance(stub, transcriber.StubTranscriber)
+    assert transcriber.get_transcriber('stub', 'tiny') is stub
+    with pytest.raises(ValueError):
+        transcriber.get_transcriber('unknown', 'tiny')
+
+
+def test_find_silence_split_picks_quiet_region():
+    samples = make_pcm(10, silences=[(6.2, 6.6)])
+    split = transcriber.find_silence_split(samples, 8 * SAMPLE_RATE, 4 * SAMPLE_RATE)
+    assert 6.2 * SAMPLE_RATE <= split <= 6.6 * SAMPLE_RATE
+
+
+def test_find_silence_split_without_search_window_keeps_target():
+    samples = make_pcm(1)
+    assert transcriber.find_silence_split(samples, 100, 0) == 100
+
+
+def test_shift_segments_adds_offset():
+    result = {'segments': [{'start': 0.0, 'end': 5.0, 'text': 'a'}, {'start': 5.0, 'end': 7.5, 'text': 'b'}]}
+    assert transcriber._shift_segments(result, 100.0) == [
+        {'start': 100.0, 'end': 105.0, 'text': 'a'}, {'start': 105.0, 'end': 107.5, 'text': 'b'}]
+
+
+def test_iter_silence_chunks_splits_at_silence(monkeypatch, fake_audio):
+    monkeypatch.setattr(transcriber, 'SILENCE_SEARCH_SECONDS', 5)
+    samples = make_pcm(65, silences=[(17.0, 17.5), (36.0, 36.5)])
+    fake_audio(samples)
+
+    chunks = list(transcriber.iter_silence_chunks('audio.m4a', target_seconds=20))
+    offsets = [offset for offset, _ in chunks]
+    assert 17.0 <= offsets[1] <= 17.5
+    assert 36.0 <= offsets[2] <= 36.5
+    # 各段首尾相接，合併後與原始音訊相同
+    for (offset, chunk), next_offset in zip(chunks, offsets[1:] + [len(samples) / SAMPLE_RATE]):
+        assert offset + len(chunk) / SAMPLE_RATE == pytest.approx(next_offset)
+    np.testing.assert_array_equal(np.concatenate([chunk for _, chunk in chunks]), samples)
+
+
+def test_transcribe_audio_stitches_timestamps(monkeypatch, fake_audio):
+    monkeypatch.setattr(transcriber, 'AUDIO_CHUNK_SECONDS', 20)
+    monkeypatch.setattr(transcriber, 'SILENCE_SEARCH_SECONDS', 5)
+    fake_audio(make_pcm(65, silences=[(17.0, 17.5), (36.0, 36.5)]))
+
+    result = transcriber.transcribe_audio('audio.m4a', backend='stub', model_size='tiny', chunked=False)
+    segments = result['segments']
+    assert result['language'] == 'en'
+    assert segments[0]['start'] == 0.0
+    assert segments[-1]['end'] == pytest.approx(65.0)
+    # 片段時間已換算為整段音訊的時間：依序排列且彼此相接
+    for previous, segment in zip(segments, segments[1:]):
+        assert segment['start'] == pytest.approx(previous['end'])
+    starts = [segment['start'] for segment in segments]
+    assert any(17.0 <= start <= 17.5 for start in starts)
+    assert any(36.0 <= start <= 36.5 for start in starts)
@@ -0,0 +1,50 @@
+import subprocess
+import logging
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# whisper 所需的輸入格式：16kHz 單聲道 float32 PCM
+SAMPLE_RATE = 16000
+BYTES_PER_SAMPLE = 4
+# 長影片以固定長度的視窗讀取，記憶體用量約為 AUDIO_CHUNK_SECONDS * 64KB
+AUDIO_CHUNK_SECONDS = 600
+
+
+def _ffmpeg_pcm_command(input_path):
+    return [
+        'ffmpeg',
+        '-nostdin',
+        '-loglevel', 'error',
+        '-i', input_path,
+        '-f', 'f32le',  # 原始 float32 PCM，不經過有損編碼
+        '-ac', '1',  # 設置聲道為單聲道
+        '-ar', str(SAMPLE_RATE),  # 設置取樣率為 16000Hz
+        'pipe:1'
+    ]
+
+
+def iter_audio_chunks(input_path, chunk_seconds=None):
+    """逐段讀取 ffmpeg 輸出的 PCM，產生 (起始秒數, 樣本陣列)，多小時的音訊也只佔用一個視窗的記憶體。"""
+    chunk_seconds = chunk_seconds or AUDIO_CHUNK_SECONDS
+    chunk_bytes = int(chunk_seconds * SAMPLE_RATE) * BYTES_PER_SAMPLE
+    process = subprocess.Popen(_ffmpeg_pcm_command(input_path), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    offset_samples = 0
+    try:
+        while True:
+            data = process.stdout.read(chunk_bytes)
+            usable = len(data) - len(data) % BYTES_PER_SAMPLE
+            if usable == 0:
+                break
+            samples = np.frombuffer(data[:usable], dtype=np.float32)
+            yield offset_samples / SAMPLE_RATE, samples
+            offset_samples += len(samples)
+    finally:
+        process.stdout.close()
+        stderr = process.stderr.read().decode('utf-8', errors='replace')
+        process.stderr.close()
+        returncode = process.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, process.args, stderr=stderr)
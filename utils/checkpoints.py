@@ -0,0 +1,123 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+from database import get_checkpoint, save_checkpoint, delete_checkpoints
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# 階段檢查點：每個處理階段的輸出連同指紋（階段的輸入與參數的雜湊）存於資料庫，
+# 重新處理同一支影片時，指紋相符的階段直接沿用輸出，只重做輸入或參數改變的階段
+CHECKPOINTS_ENABLED = True
+CHECKPOINT_VERSION = 1  # 階段輸出的格式改變時遞增，使既有的檢查點全部失效
+# 下載的影音串流存於 CHECKPOINT_ROOT/<youtube_id>/，只保留最近使用的 MEDIA_CACHE_VIDEOS 支影片，
+# 且總大小不超過 MAX_MEDIA_CACHE_BYTES（使用中的串流不會被淘汰，因此可能暫時超過）
+CHECKPOINT_ROOT = 'checkpoints'
+MEDIA_CACHE_VIDEOS = 10
+MAX_MEDIA_CACHE_BYTES = 10 * 1024 * 1024 * 1024
+
+_active = {}  # youtube_id -> 使用中的處理數，使用中的串流不會被淘汰
+_lock = threading.Lock()
+
+
+def fingerprint(params):
+    """以參數字典的 JSON 表示計算指紋。"""
+    payload = json.dumps({'version': CHECKPOINT_VERSION, **params}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def content_digest(text):
+    """上游階段的輸出以內容雜湊納入下游的指紋：上游重做且輸出改變時，下游自然失效。"""
+    return hashlib.sha256((text or '').encode('utf-8')).hexdigest()
+
+
+class StageCheckpoints:
+    """單支影片的階段檢查點，以 with 區塊標記串流目錄為使用中。
+
+    run() 可從多個分支執行緒同時呼叫，各階段的記錄互不相關。
+    """
+
+    def __init__(self, youtube_id):
+        self.youtube_id = youtube_id
+        self.media_dir = os.path.join(CHECKPOINT_ROOT, youtube_id)
+        self.reused = []
+
+    def __enter__(self):
+        os.makedirs(self.media_dir, exist_ok=True)
+        # 更新修改時間，作為淘汰串流時的最近使用時間
+        os.utime(self.media_dir)
+        with _lock:
+            _active[self.youtube_id] = _active.get(self.youtube_id, 0) + 1
+        return self
+
+    def __exit__(self, *exc_info):
+        with _lock:
+            _active[self.youtube_id] -= 1
+            if not _active[self.youtube_id]:
+                del _active[self.youtube_id]
+        prune_media()
+
+    def run(self, stage, params, compute, valid=None):
+        """指紋相符且 valid(output) 成立時返回檢查點中的輸出，否則執行 compute() 並保存其輸出。
+
+        params 須包含所有會影響輸出的輸入與參數；compute() 返回 None 表示失敗，不保存。
+        """
+        key = fingerprint({'stage': stage, **params})
+        if CHECKPOINTS_ENABLED:
+            record = get_checkpoint(self.youtube_id, stage)
+            if record and record[0] == key and (valid is None or valid(record[1])):
+                logger.info(f"階段 {stage} 的指紋相符，沿用檢查點")
+                self.reused.append(stage)
+                return record[1]
+
+        output = compute()
+        if CHECKPOINTS_ENABLED and output is not None:
+            save_checkpoint(self.youtube_id, stage, key, output)
+        return output
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass  # 檔案可能剛被其他任務移除
+    return total
+
+
+def prune_media(keep=None, max_bytes=None):
+    """依最近使用時間淘汰串流目錄，只保留 keep 支影片且總大小不超過 max_bytes，返回移除的目錄數。"""
+    keep = MEDIA_CACHE_VIDEOS if keep is None else keep
+    max_bytes = MAX_MEDIA_CACHE_BYTES if max_bytes is None else max_bytes
+    if not os.path.isdir(CHECKPOINT_ROOT):
+        return 0
+    with _lock:
+        active = set(_active)
+    paths = [os.path.join(CHECKPOINT_ROOT, name) for name in os.listdir(CHECKPOINT_ROOT)]
+    paths = sorted((path for path in paths if os.path.isdir(path)), key=os.path.getmtime, reverse=True)
+    removed = 0
+    kept = 0
+    total = 0
+    for path in paths:
+        size = _dir_size(path)
+        if os.path.basename(path) in active or (kept < keep and total + size <= max_bytes):
+            kept += 1
+            total += size
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        removed += 1
+    if removed:
+        logger.info(f"已移除 {removed} 支影片的下載串流，保留 {kept} 支共 {total} 位元組")
+    return removed
+
+
+def clear_checkpoints(youtube_id):
+    """刪除影片的所有檢查點與下載的串流。"""
+    delete_checkpoints(youtube_id)
+    shutil.rmtree(os.path.join(CHECKPOINT_ROOT, youtube_id), ignore_errors=True)
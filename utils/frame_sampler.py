@@ -0,0 +1,248 @@
+import os
+import glob
+import time
+import subprocess
+import logging
+import cv2
+from utils import metrics
+from utils.image_processor import HashIndex, remove_duplicate_images
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# 截圖取樣模式：
+#   'seek'       - 每張截圖前呼叫 video.set() 跳轉（原始做法，長影片會反覆回到關鍵幀解碼）
+#   'sequential' - 只順向解碼一次，以 grab() 快速跳過幀，只在取樣幀呼叫 retrieve()
+#   'ffmpeg'     - 交由單一 ffmpeg 濾鏡流程直接輸出 JPEG
+#   'scene'      - 順向解碼時偵測畫面切換，只在內容改變時才寫出截圖
+SAMPLING_MODES = ('seek', 'sequential', 'ffmpeg', 'scene')
+SAMPLING_MODE = 'sequential'
+FFMPEG_JPEG_QUALITY = 2  # ffmpeg -q:v，2 約等同 cv2.imwrite 的預設品質
+
+# 畫面切換偵測設定（'scene' 模式）
+SCENE_THRESHOLD = 12.0  # 縮圖灰階平均絕對差（0-255）超過此值視為畫面切換
+SCENE_MIN_GAP = 2.0  # 兩張截圖間的最短間隔（秒）
+SCENE_CHECK_INTERVAL = 0.5  # 每隔多少秒檢查一次畫面
+SCENE_THUMBNAIL_SIZE = (64, 36)
+
+# 去重複設定：在寫入磁碟前以 phash 過濾重複畫面
+DEDUP_HASH_SIZE = 16
+DEDUP_SIMILARITY_THRESHOLD = 5
+
+
+def get_sampling_params(video_path, capture_interval):
+    """返回 (fps, 總幀數, 取樣步長)。"""
+    video = cv2.VideoCapture(video_path)
+    if not video.isOpened():
+        raise IOError("無法打開視頻文件")
+    fps = video.get(cv2.CAP_PROP_FPS)
+    total_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+    video.release()
+    return fps, total_frames, _get_step(fps, capture_interval)
+
+
+def _get_step(fps, capture_interval):
+    step = int(fps * capture_interval)
+    if step <= 0:
+        logger.warning(f"Invalid step size calculated: {step}. Using default step of 1 second.")
+        step = int(fps) if fps > 0 else 30  # 假設 30fps 如果無法獲取 fps
+    return step
+
+
+def _frame_timestamp(frame_index, fps):
+    return frame_index / fps if fps > 0 else frame_index / 30
+
+
+def _save_screenshot(frame, frame_index, fps, video_id, output_folder, dedup_index=None):
+    """保存截圖並返回截圖資訊；若與已保留的截圖重複則不寫入並返回 None。"""
+    if dedup_index is not None and dedup_index.check_frame(frame):
+        return None
+    timestamp = _frame_timestamp(frame_index, fps)
+    filename = f"{video_id}_{timestamp:.2f}.jpg"
+    filepath = os.path.join(output_folder, filename)
+    cv2.imwrite(filepath, frame)
+    logger.info(f"截圖保存: {filepath}")
+    return {
+        'filename': filename,
+        'timestamp': f"{timestamp:.2f}s"
+    }
+
+
+def _extract_by_seek(video_path, output_folder, video_id, capture_interval, dedup_index=None):
+    video = cv2.VideoCapture(video_path)
+    if not video.isOpened():
+        raise IOError("無法打開視頻文件")
+
+    fps = video.get(cv2.CAP_PROP_FPS)
+    total_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+    logger.info(f"視頻 FPS: {fps}, 總幀數: {total_frames}")
+    step = _get_step(fps, capture_interval)
+
+    screenshots = []
+    for i in range(0, total_frames, step):
+        video.set(cv2.CAP_PROP_POS_FRAMES, i)
+        success, frame = video.read()
+        if success:
+            screenshot = _save_screenshot(frame, i, fps, video_id, output_folder, dedup_index)
+            if screenshot:
+                screenshots.append(screenshot)
+
+    video.release()
+    return screenshots
+
+
+def _extract_sequential(video_path, output_folder, video_id, capture_interval, dedup_index=None):
+    video = cv2.VideoCapture(video_path)
+    if not video.isOpened():
+        raise IOError("無法打開視頻文件")
+
+    fps = video.get(cv2.CAP_PROP_FPS)
+    total_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+    logger.info(f"視頻 FPS: {fps}, 總幀數: {total_frames}")
+    step = _get_step(fps, capture_interval)
+
+    screenshots = []
+    frame_index = 0
+    # grab() 只解碼不轉換顏色空間，比 read() 便宜得多；只有取樣幀才 retrieve()
+    while video.grab():
+        if frame_index % step == 0:
+            success, frame = video.retrieve()
+            if success:
+                screenshot = _save_screenshot(frame, frame_index, fps, video_id, output_folder, dedup_index)
+                if screenshot:
+                    screenshots.append(screenshot)
+        frame_index += 1
+
+    video.release()
+    return screenshots
+
+
+def _extract_with_ffmpeg(video_path, output_folder, video_id, capture_interval):
+    fps, total_frames, step = get_sampling_params(video_path, capture_interval)
+    logger.info(f"視頻 FPS: {fps}, 總幀數: {total_frames}")
+
+    # 以幀序號選取（而非 fps=1/N）以確保與其他模式取得相同的幀與檔名
+    temp_pattern = os.path.join(output_folder, f"{video_id}_ffmpeg_%06d.jpg")
+    command = [
+        'ffmpeg', '-y', '-loglevel', 'error',
+        '-i', video_path,
+        '-vf', f"select='not(mod(n\\,{step}))'",
+        '-vsync', 'vfr',
+        '-q:v', str(FFMPEG_JPEG_QUALITY),
+        temp_pattern
+    ]
+    subprocess.run(command, check=True)
+
+    screenshots = []
+    temp_files = sorted(glob.glob(os.path.join(output_folder, f"{video_id}_ffmpeg_*.jpg")))
+    for output_index, temp_path in enumerate(temp_files):
+        timestamp = _frame_timestamp(output_index * step, fps)
+        filename = f"{video_id}_{timestamp:.2f}.jpg"
+        os.replace(temp_path, os.path.join(output_folder, filename))
+        screenshots.append({
+            'filename': filename,
+            'timestamp': f"{timestamp:.2f}s"
+        })
+    logger.info(f"ffmpeg 截圖完成: {len(screenshots)} 張")
+    return screenshots
+
+
+def _scene_thumbnail(frame):
+    small = cv2.resize(frame, SCENE_THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+
+def _extract_scene_changes(video_path, output_folder, video_id, scene_threshold=None, min_scene_gap=None,
+                           dedup_index=None):
+    scene_threshold = SCENE_THRESHOLD if scene_threshold is None else scene_threshold
+    min_scene_gap = SCENE_MIN_GAP if min_scene_gap is None else min_scene_gap
+
+    video = cv2.VideoCapture(video_path)
+    if not video.isOpened():
+        raise IOError("無法打開視頻文件")
+
+    fps = video.get(cv2.CAP_PROP_FPS)
+    total_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+    logger.info(f"視頻 FPS: {fps}, 總幀數: {total_frames}, 切換門檻: {scene_threshold}, 最短間隔: {min_scene_gap}s")
+    check_step = _get_step(fps, SCENE_CHECK_INTERVAL)
+    min_gap_frames = int(min_scene_gap * (fps if fps > 0 else 30))
+
+    screenshots = []
+    frame_index = 0
+    checked = 0
+    last_saved_index = None
+    last_thumbnail = None
+    while video.grab():
+        if frame_index % check_step == 0 and (
+                last_saved_index is None or frame_index - last_saved_index >= min_gap_frames):
+            success, frame = video.retrieve()
+            if success:
+                checked += 1
+                thumbnail = _scene_thumbnail(frame)
+                # 與上一張「已保存」的截圖比較，緩慢淡入淡出累積到門檻時也會被捕捉
+                if last_thumbnail is None or cv2.absdiff(thumbnail, last_thumbnail).mean() > scene_threshold:
+                    # 切回先前出現過的畫面（例如重複的投影片）時由 dedup_index 過濾
+                    screenshot = _save_screenshot(frame, frame_index, fps, video_id, output_folder, dedup_index)
+                    if screenshot:
+                        screenshots.append(screenshot)
+                    last_saved_index = frame_index
+                    last_thumbnail = thumbnail
+        frame_index += 1
+
+    video.release()
+    logger.info(f"畫面切換偵測完成: 檢查 {checked} 幀，保存 {len(screenshots)} 張截圖")
+    return screenshots
+
+
+def _record_stages(timings, sampling_seconds, dedup_seconds):
+    # 取樣與去重複分別記錄，取樣的耗時不含交錯在其中的去重複時間
+    for stage, seconds in (('screenshots', sampling_seconds), ('dedup', dedup_seconds)):
+        metrics.observe_stage(stage, seconds)
+        if timings is not None:
+            timings[stage] = round(seconds, 3)
+
+
+def extract_screenshots(video_path, output_folder, video_id, capture_interval=10, mode=None,
+                        scene_threshold=None, min_scene_gap=None, deduplicate=True, adjacent_only=False, timings=None):
+    """擷取截圖並保存為 JPEG，返回去重複後的截圖資訊列表。
+
+    'scene' 模式忽略 capture_interval，改依畫面切換與 min_scene_gap 決定何時截圖。
+    OpenCV 模式在寫入前即以記憶體中的 phash 去重複；ffmpeg 模式直接輸出檔案，因此寫入後才去重複。
+    'screenshots'（取樣）與 'dedup' 階段的耗時記錄到 utils.metrics，timings 不為 None 時也寫入其中。
+    """
+    mode = mode or SAMPLING_MODE
+    if mode not in SAMPLING_MODES:
+        raise ValueError(f"未知的截圖取樣模式: {mode}")
+
+    logger.info(f"截圖取樣模式: {mode}")
+    start = time.perf_counter()
+    if mode == 'ffmpeg':
+        screenshots = _extract_with_ffmpeg(video_path, output_folder, video_id, capture_interval)
+        sampling_seconds = time.perf_counter() - start
+        captured = len(screenshots)
+        if deduplicate:
+            screenshots = remove_duplicate_images(output_folder, screenshots, DEDUP_HASH_SIZE,
+                                                  DEDUP_SIMILARITY_THRESHOLD, adjacent_only)
+        _record_stages(timings, sampling_seconds, time.perf_counter() - start - sampling_seconds)
+        metrics.observe_screenshots(captured, len(screenshots))
+        return screenshots
+
+    dedup_index = HashIndex(DEDUP_HASH_SIZE, DEDUP_SIMILARITY_THRESHOLD, adjacent_only) if deduplicate else None
+    if mode == 'scene':
+        screenshots = _extract_scene_changes(video_path, output_folder, video_id, scene_threshold, min_scene_gap,
+                                             dedup_index)
+    elif mode == 'seek':
+        screenshots = _extract_by_seek(video_path, output_folder, video_id, capture_interval, dedup_index)
+    else:
+        screenshots = _extract_sequential(video_path, output_folder, video_id, capture_interval, dedup_index)
+
+    elapsed = time.perf_counter() - start
+    if dedup_index is not None:
+        # 寫入前去重複：被過濾的幀不會寫入磁碟，去重複前的數量即檢查過的幀數
+        _record_stages(timings, elapsed - dedup_index.seconds, dedup_index.seconds)
+        metrics.observe_screenshots(dedup_index.checked, len(screenshots))
+    else:
+        _record_stages(timings, elapsed, 0.0)
+        metrics.observe_screenshots(len(screenshots), len(screenshots))
+    return screenshots
@@ -1,29 +1,97 @@
 import os
+import time
 from PIL import Image
 import imagehash
-from collections import defaultdict
+import numpy as np
+import cv2
 
-def remove_duplicate_images(folder_path, screenshots, hash_size=16, similarity_threshold=5):
+# 每個位元組中 1 的個數，用於向量化計算漢明距離
+POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def compute_frame_hash(frame, hash_size=16):
+    """直接由 OpenCV 解碼出的 BGR 陣列計算 phash，不必先寫入 JPEG 再讀回。"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return imagehash.phash(Image.fromarray(gray), hash_size=hash_size)
+
+
+def pack_hash(img_hash):
+    """將 imagehash 的布林矩陣打包為 uint64 陣列（不足 64 位元的部分補零）。"""
+    packed = np.packbits(img_hash.hash.flatten())
+    padding = (-len(packed)) % 8
+    if padding:
+        packed = np.concatenate([packed, np.zeros(padding, dtype=np.uint8)])
+    return packed.view(np.uint64)
+
+
+class HashIndex:
+    """以打包的 uint64 陣列保存已保留截圖的雜湊，並以向量化 popcount 查找相似圖像。
+
+    adjacent_only=True 時只與上一張保留的截圖比較（時間上的去重複）。
+    similarity_threshold 的語意與 imagehash 相同：漢明距離 <= 門檻即視為重複。
+    """
+
+    def __init__(self, hash_size=16, similarity_threshold=5, adjacent_only=False):
+        self.hash_size = hash_size
+        self.similarity_threshold = similarity_threshold
+        self.adjacent_only = adjacent_only
+        self._words = (hash_size * hash_size + 63) // 64
+        self._hashes = np.zeros((64, self._words), dtype=np.uint64)
+        self._count = 0
+        # check_frame 檢查過的幀數與累計耗時（計算雜湊與比對），供指標記錄
+        self.checked = 0
+        self.seconds = 0.0
+
+    def __len__(self):
+        return self._count
+
+    def is_duplicate(self, packed):
+        if self._count == 0:
+            return False
+        if self.adjacent_only:
+            candidates = self._hashes[self._count - 1:self._count]
+        else:
+            candidates = self._hashes[:self._count]
+        xor = np.bitwise_xor(candidates, packed)
+        distances = POPCOUNT_TABLE[xor.view(np.uint8)].reshape(len(candidates), -1).sum(axis=1)
+        return bool((distances <= self.similarity_threshold).any())
+
+    def add(self, packed):
+        if self._count == len(self._hashes):
+            self._hashes = np.concatenate([self._hashes, np.zeros_like(self._hashes)])
+        self._hashes[self._count] = packed
+        self._count += 1
+
+    def check_frame(self, frame):
+        """若 frame 與已保留的截圖重複則返回 True，否則將其加入索引並返回 False。"""
+        start = time.perf_counter()
+        try:
+            packed = pack_hash(compute_frame_hash(frame, self.hash_size))
+            if self.is_duplicate(packed):
+                return True
+            self.add(packed)
+            return False
+        finally:
+            self.checked += 1
+            self.seconds += time.perf_counter() - start
+
+
+def remove_duplicate_images(folder_path, screenshots, hash_size=16, similarity_threshold=5, adjacent_only=False):
     unique_screenshots = []
-    hash_dict = defaultdict(list)
+    index = HashIndex(hash_size, similarity_threshold, adjacent_only)
 
     for screenshot in screenshots:
         img_path = os.path.join(folder_path, screenshot['filename'])
         try:
             with Image.open(img_path) as img:
                 # Use phash instead of average_hash for better accuracy
-                img_hash = imagehash.phash(img, hash_size=hash_size)
-
-            is_duplicate = False
-            for existing_hash in hash_dict:
-                if img_hash - existing_hash <= similarity_threshold:
-                    is_duplicate = True
-                    os.remove(img_path)
-                    print(f"Removed duplicate image: {screenshot['filename']}")
-                    break
-
-            if not is_duplicate:
-                hash_dict[img_hash].append(screenshot)
+                packed = pack_hash(imagehash.phash(img, hash_size=hash_size))
+
+            if index.is_duplicate(packed):
+                os.remove(img_path)
+                print(f"Removed duplicate image: {screenshot['filename']}")
+            else:
+                index.add(packed)
                 unique_screenshots.append(screenshot)
 
         except IOError as e:
@@ -34,4 +102,4 @@ def remove_duplicate_images(folder_path, screenshots, hash_size=16, similarity_t
     return unique_screenshots
 
 # Example usage:
-# unique_screenshots = remove_duplicate_images('/path/to/folder', screenshots, hash_size=16, similarity_threshold=10)
\ No newline at end of file
+# unique_screenshots = remove_duplicate_images('/path/to/folder', screenshots, hash_size=16, similarity_threshold=10)
@@ -0,0 +1,121 @@
+import re
+import hashlib
+import logging
+from utils import metrics
+from utils.vtt_translator import detect_language
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# 語言名稱與 detect_language 的輸出一致（小寫英文名稱），以便沿用既有的 "chinese" 判斷
+LANGUAGE_CODE_NAMES = {
+    'zh': 'chinese', 'en': 'english', 'ja': 'japanese', 'ko': 'korean',
+    'fr': 'french', 'de': 'german', 'es': 'spanish', 'it': 'italian',
+    'pt': 'portuguese', 'nl': 'dutch', 'ru': 'russian', 'ar': 'arabic',
+    'th': 'thai', 'vi': 'vietnamese', 'id': 'indonesian', 'hi': 'hindi',
+}
+
+# 拉丁字母語言的常見虛詞，用於快速判斷
+STOPWORDS = {
+    'english': {'the', 'and', 'is', 'of', 'to', 'in', 'that', 'it', 'you', 'for', 'this', 'with', 'are', 'was',
+                'on', 'be', 'have', 'we', 'not', 'what'},
+    'french': {'le', 'la', 'les', 'et', 'est', 'de', 'des', 'un', 'une', 'que', 'qui', 'pas', 'pour', 'dans',
+               'je', 'vous', 'nous', 'ce', 'sur', 'avec'},
+    'spanish': {'el', 'la', 'los', 'las', 'y', 'es', 'de', 'que', 'en', 'un', 'una', 'por', 'para', 'con', 'no',
+                'se', 'lo', 'como', 'pero', 'del'},
+    'german': {'der', 'die', 'das', 'und', 'ist', 'nicht', 'ich', 'sie', 'es', 'wir', 'mit', 'ein', 'eine',
+               'zu', 'den', 'auf', 'auch', 'sich', 'dem', 'von'},
+    'italian': {'il', 'di', 'che', 'e', 'la', 'per', 'non', 'un', 'una', 'sono', 'con', 'del', 'della', 'gli',
+                'questo', 'come', 'ma', 'anche', 'io', 'le'},
+    'portuguese': {'o', 'a', 'os', 'as', 'de', 'que', 'e', 'do', 'da', 'em', 'um', 'uma', 'para', 'com', 'não',
+                   'se', 'na', 'no', 'por', 'mais'},
+    'dutch': {'de', 'het', 'een', 'en', 'van', 'is', 'dat', 'niet', 'ik', 'je', 'we', 'op', 'te', 'zijn', 'met',
+              'voor', 'maar', 'ook', 'als', 'wat'},
+}
+
+SCRIPT_PATTERNS = {
+    'kana': re.compile(r'[\u3040-\u30ff]'),
+    'han': re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]'),
+    'hangul': re.compile(r'[\uac00-\ud7af\u1100-\u11ff]'),
+    'cyrillic': re.compile(r'[\u0400-\u04ff]'),
+    'arabic': re.compile(r'[\u0600-\u06ff]'),
+    'thai': re.compile(r'[\u0e00-\u0e7f]'),
+    'devanagari': re.compile(r'[\u0900-\u097f]'),
+    'latin': re.compile(r'[A-Za-z\u00c0-\u024f]'),
+}
+SCRIPT_LANGUAGES = {'hangul': 'korean', 'cyrillic': 'russian', 'arabic': 'arabic', 'thai': 'thai',
+                    'devanagari': 'hindi'}
+WORD_PATTERN = re.compile(r"[a-z\u00e0-\u00ff']+")
+
+LOCAL_SAMPLE_CHARS = 2000  # 本地偵測只看開頭的字數
+STOPWORD_MIN_RATIO = 0.15  # 虛詞比例低於此值時不下判斷
+STOPWORD_MARGIN = 1.3  # 最高分須為次高分的此倍數
+
+
+def language_from_code(code):
+    """將 yt-dlp 字幕檔名或 whisper 返回的語言代碼（如 'zh-TW', 'en'）轉換為語言名稱。"""
+    if not code:
+        return None
+    return LANGUAGE_CODE_NAMES.get(code.split('-')[0].split('_')[0].lower())
+
+
+def detect_language_local(text):
+    """以 Unicode 文字系統與虛詞頻率判斷語言；無法確定時返回 None。"""
+    sample = text[:LOCAL_SAMPLE_CHARS]
+    counts = {script: len(pattern.findall(sample)) for script, pattern in SCRIPT_PATTERNS.items()}
+    total = sum(counts.values())
+    if total == 0:
+        return None
+
+    cjk = counts['kana'] + counts['han']
+    if cjk / total > 0.5:
+        # 日文幾乎必定夾雜假名，中文則沒有
+        return 'japanese' if counts['kana'] / cjk > 0.05 else 'chinese'
+    for script, language in SCRIPT_LANGUAGES.items():
+        if counts[script] / total > 0.5:
+            return language
+
+    if counts['latin'] / total > 0.5:
+        words = WORD_PATTERN.findall(sample.lower())
+        if len(words) < 5:
+            return None
+        scores = sorted(((sum(1 for word in words if word in stopwords) / len(words), language)
+                         for language, stopwords in STOPWORDS.items()), reverse=True)
+        (best_score, best_language), (second_score, _) = scores[0], scores[1]
+        if best_score >= STOPWORD_MIN_RATIO and best_score >= second_score * STOPWORD_MARGIN:
+            return best_language
+    return None
+
+
+class LanguageResolver:
+    """依成本由低到高判斷語言：已知的語言代碼 → 本地偵測 → LLM，結果依文字內容記憶。
+
+    每支影片建立一個實例，同一段文字在處理過程中只會被判斷一次；各方式的判斷次數記錄於
+    utils.metrics 的 language_detections_total，可觀察退回 LLM 的比例。
+    """
+
+    def __init__(self):
+        self._memo = {}
+
+    def resolve(self, text, code=None):
+        language = language_from_code(code)
+        if language:
+            logger.info(f"由語言代碼 {code} 判斷語言: {language}")
+            metrics.inc('language_detections_total', method='code')
+            return language
+
+        key = hashlib.sha256(text[:LOCAL_SAMPLE_CHARS].encode('utf-8')).hexdigest()
+        if key in self._memo:
+            return self._memo[key]
+
+        language = detect_language_local(text)
+        if language:
+            logger.info(f"本地偵測語言: {language}")
+            metrics.inc('language_detections_total', method='local')
+        else:
+            language = detect_language(text)
+            logger.info(f"以 LLM 偵測語言: {language}")
+            metrics.inc('language_detections_total', method='llm')
+        self._memo[key] = language
+        return language
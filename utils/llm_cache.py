@@ -0,0 +1,127 @@
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from utils import metrics
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# 模型輸出快取設定
+CACHE_ENABLED = True
+CACHE_DB = 'llm_cache.db'
+CACHE_MAX_BYTES = 200 * 1024 * 1024  # 超過此大小時依最近使用時間淘汰
+CACHE_EVICT_RATIO = 0.9  # 淘汰至上限的此比例，避免每次寫入都觸發淘汰
+
+_lock = threading.Lock()
+_conn = None
+_total_bytes = 0
+
+
+def _get_conn():
+    global _conn, _total_bytes
+    if _conn is None:
+        _conn = sqlite3.connect(CACHE_DB, check_same_thread=False)
+        _conn.execute('PRAGMA journal_mode=WAL')
+        _conn.execute('''CREATE TABLE IF NOT EXISTS cache
+                         (key TEXT PRIMARY KEY,
+                          value TEXT,
+                          size INTEGER,
+                          last_access REAL)''')
+        _conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_last_access ON cache (last_access)')
+        _conn.commit()
+        _total_bytes = _conn.execute('SELECT COALESCE(SUM(size), 0) FROM cache').fetchone()[0]
+        metrics.set_value('llm_cache_bytes', _total_bytes)
+    return _conn
+
+
+def make_key(*parts):
+    """以模型名稱、語言與文字等組成內容定址的快取鍵。"""
+    return hashlib.sha256('\x1f'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def get_many(keys):
+    """批次查詢快取，返回 {key: value}，命中的項目會更新最近使用時間。"""
+    if not CACHE_ENABLED or not keys:
+        return {}
+    unique_keys = list(dict.fromkeys(keys))
+    found = {}
+    with _lock:
+        conn = _get_conn()
+        # SQLite 預設的參數數量上限為 999
+        for i in range(0, len(unique_keys), 500):
+            chunk = unique_keys[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            rows = conn.execute(f'SELECT key, value FROM cache WHERE key IN ({placeholders})', chunk).fetchall()
+            found.update(rows)
+        if found:
+            now = time.time()
+            conn.executemany('UPDATE cache SET last_access = ? WHERE key = ?', [(now, key) for key in found])
+            conn.commit()
+    # 命中率等統計以 Prometheus 計數器輸出（見 utils.metrics 與 /metrics）
+    hits = sum(1 for key in keys if key in found)
+    metrics.inc('llm_cache_hits_total', hits)
+    metrics.inc('llm_cache_misses_total', len(keys) - hits)
+    return found
+
+
+def get(key):
+    return get_many([key]).get(key)
+
+
+def put_many(items):
+    """批次寫入 {key: value}，總大小超過上限時淘汰最久未使用的項目。"""
+    global _total_bytes
+    if not CACHE_ENABLED or not items:
+        return
+    with _lock:
+        conn = _get_conn()
+        now = time.time()
+        rows = [(key, value, len(value.encode('utf-8')), now) for key, value in items.items()]
+        # 覆寫既有項目時扣除舊的大小
+        replaced = 0
+        for i in range(0, len(rows), 500):
+            chunk = [row[0] for row in rows[i:i + 500]]
+            placeholders = ','.join('?' * len(chunk))
+            replaced += conn.execute(f'SELECT COALESCE(SUM(size), 0) FROM cache WHERE key IN ({placeholders})',
+                                     chunk).fetchone()[0]
+        conn.executemany('INSERT OR REPLACE INTO cache (key, value, size, last_access) VALUES (?, ?, ?, ?)', rows)
+        _total_bytes += sum(row[2] for row in rows) - replaced
+        if _total_bytes > CACHE_MAX_BYTES:
+            _evict(conn)
+        conn.commit()
+        metrics.set_value('llm_cache_bytes', _total_bytes)
+
+
+def put(key, value):
+    put_many({key: value})
+
+
+def _evict(conn):
+    global _total_bytes
+    target = CACHE_MAX_BYTES * CACHE_EVICT_RATIO
+    evicted = 0
+    while _total_bytes > target:
+        rows = conn.execute('SELECT key, size FROM cache ORDER BY last_access LIMIT 200').fetchall()
+        if not rows:
+            break
+        for key, size in rows:
+            if _total_bytes <= target:
+                break
+            conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+            _total_bytes -= size
+            evicted += 1
+    metrics.inc('llm_cache_evictions_total', evicted)
+    logger.info(f"快取淘汰 {evicted} 筆項目，目前大小: {_total_bytes} 位元組")
+
+
+def clear():
+    global _total_bytes
+    with _lock:
+        conn = _get_conn()
+        conn.execute('DELETE FROM cache')
+        conn.commit()
+        _total_bytes = 0
+    metrics.set_value('llm_cache_bytes', 0)
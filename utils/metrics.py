@@ -0,0 +1,218 @@
+import time
+import logging
+import functools
+import threading
+from contextlib import contextmanager
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# 直方圖的分桶上限（秒）
+STAGE_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+# 名稱 → (類型, 說明, 分桶)；/metrics 依此順序以 Prometheus 文字格式輸出
+METRICS = {
+    'video_stage_seconds': ('histogram', '處理階段耗時（秒）', STAGE_BUCKETS),
+    'videos_processed_total': ('counter', '處理完成或失敗的影片數', None),
+    'llm_requests_total': ('counter', '完成的模型請求數（不含快取命中）', None),
+    'llm_request_errors_total': ('counter', '失敗的模型請求數（含之後重試成功的）', None),
+    'llm_request_seconds': ('histogram', '模型請求耗時（秒，不含等待並行上限）', LLM_BUCKETS),
+    'llm_prompt_tokens_total': ('counter', '模型請求的 prompt token 數', None),
+    'llm_completion_tokens_total': ('counter', '模型回覆的 token 數', None),
+    'language_detections_total': ('counter', '語言判斷次數，依判斷方式（code、local、llm）分列', None),
+    'llm_cache_hits_total': ('counter', '模型輸出快取命中的查詢數', None),
+    'llm_cache_misses_total': ('counter', '模型輸出快取未命中的查詢數', None),
+    'llm_cache_evictions_total': ('counter', '模型輸出快取淘汰的項目數', None),
+    'llm_cache_bytes': ('gauge', '模型輸出快取目前的大小（位元組）', None),
+    'screenshots_captured_total': ('counter', '去重複前的截圖數', None),
+    'screenshots_kept_total': ('counter', '去重複後保留的截圖數', None),
+    'db_query_seconds': ('histogram', '資料庫操作耗時（秒）', DB_BUCKETS),
+}
+
+_lock = threading.Lock()
+_values = {}  # (名稱, 標籤) → 計數器的值，或直方圖的 [各分桶累計數..., 總和, 次數]
+_local = threading.local()
+
+
+class VideoMetrics:
+    """單支影片處理期間的指標，處理完成後附加在影片記錄上。
+
+    以 recording() 設為目前執行緒的記錄對象；交給其他執行緒的工作以 propagate() 包裝後沿用同一個記錄對象。
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.llm = {'requests': 0, 'errors': 0, 'seconds': 0.0, 'prompt_tokens': 0, 'completion_tokens': 0}
+        self.screenshots = {'captured': 0, 'kept': 0}
+        self.db = {'queries': 0, 'seconds': 0.0}
+
+    def as_dict(self):
+        with _lock:
+            return {
+                'stages': {stage: round(seconds, 3) for stage, seconds in self.stages.items()},
+                'llm': dict(self.llm, seconds=round(self.llm['seconds'], 3)),
+                'screenshots': dict(self.screenshots),
+                'db': dict(self.db, seconds=round(self.db['seconds'], 4)),
+            }
+
+
+def current_recorder():
+    return getattr(_local, 'recorder', None)
+
+
+@contextmanager
+def recording(recorder):
+    previous = current_recorder()
+    _local.recorder = recorder
+    try:
+        yield recorder
+    finally:
+        _local.recorder = previous
+
+
+def propagate(func):
+    """包裝 func，使其在其他執行緒執行時仍記錄到呼叫端目前的 VideoMetrics。"""
+    recorder = current_recorder()
+    if recorder is None:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with recording(recorder):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _values[key] = _values.get(key, 0) + amount
+
+
+def set_value(name, value, **labels):
+    with _lock:
+        _values[_key(name, labels)] = value
+
+
+def observe(name, value, **labels):
+    buckets = METRICS[name][2]
+    key = _key(name, labels)
+    with _lock:
+        entry = _values.get(key)
+        if entry is None:
+            entry = _values[key] = [0] * len(buckets) + [0.0, 0]
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                entry[index] += 1
+        entry[-2] += value
+        entry[-1] += 1
+
+
+def get_value(name, **labels):
+    """返回計數器或量測值（直方圖返回觀測次數），沒有記錄時返回 0。"""
+    with _lock:
+        value = _values.get(_key(name, labels), 0)
+    return value[-1] if isinstance(value, list) else value
+
+
+def observe_stage(stage, seconds):
+    observe('video_stage_seconds', seconds, stage=stage)
+    recorder = current_recorder()
+    if recorder is not None:
+        with _lock:
+            recorder.stages[stage] = recorder.stages.get(stage, 0.0) + seconds
+
+
+def observe_llm_request(seconds, prompt_tokens=0, completion_tokens=0):
+    inc('llm_requests_total')
+    observe('llm_request_seconds', seconds)
+    inc('llm_prompt_tokens_total', prompt_tokens)
+    inc('llm_completion_tokens_total', completion_tokens)
+    recorder = current_recorder()
+    if recorder is not None:
+        with _lock:
+            recorder.llm['requests'] += 1
+            recorder.llm['seconds'] += seconds
+            recorder.llm['prompt_tokens'] += prompt_tokens
+            recorder.llm['completion_tokens'] += completion_tokens
+
+
+def observe_llm_error():
+    inc('llm_request_errors_total')
+    recorder = current_recorder()
+    if recorder is not None:
+        with _lock:
+            recorder.llm['errors'] += 1
+
+
+def observe_screenshots(captured, kept):
+    inc('screenshots_captured_total', captured)
+    inc('screenshots_kept_total', kept)
+    recorder = current_recorder()
+    if recorder is not None:
+        with _lock:
+            recorder.screenshots['captured'] += captured
+            recorder.screenshots['kept'] += kept
+
+
+def timed_query(func):
+    """記錄資料庫函式的耗時，標籤為函式名稱；巢狀呼叫只記錄最外層。"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        depth = getattr(_local, 'db_depth', 0)
+        _local.db_depth = depth + 1
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.db_depth = depth
+            if depth == 0:
+                seconds = time.perf_counter() - start
+                observe('db_query_seconds', seconds, operation=func.__name__)
+                recorder = current_recorder()
+                if recorder is not None:
+                    with _lock:
+                        recorder.db['queries'] += 1
+                        recorder.db['seconds'] += seconds
+    return wrapper
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """以 Prometheus 文字格式（0.0.4）輸出所有指標。"""
+    with _lock:
+        values = {key: list(value) if isinstance(value, list) else value for key, value in _values.items()}
+
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for (metric, labels), value in sorted(values.items()):
+            if metric != name:
+                continue
+            if kind in ('counter', 'gauge'):
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                continue
+            for bound, count in zip(buckets, value):
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {count}")
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {value[-1]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value[-2])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {value[-1]}")
+    return '\n'.join(lines) + '\n'
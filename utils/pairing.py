@@ -0,0 +1,44 @@
+from bisect import bisect_left
+from functools import lru_cache
+from database import get_screenshots, get_cues
+
+
+# 快取最近瀏覽的影片的配對結果
+PAIRING_CACHE_SIZE = 32
+
+
+def screenshot_seconds(screenshot):
+    """將截圖的 '12.00s' 時間轉換為秒數。"""
+    return float(screenshot['timestamp'].rstrip('s'))
+
+
+def pair_screenshots(screenshots, translated_subtitles, original_subtitles):
+    """將每張截圖與開始時間落在 [本張, 下一張) 之間的字幕配對。
+
+    截圖與字幕都須依時間排序；以二分搜尋找出每個區間的字幕切片，複雜度為 O((n + m) log m)。
+    """
+    times = [screenshot_seconds(screenshot) for screenshot in screenshots]
+    bounds = times[1:] + [float('inf')]
+    translated_starts = [subtitle['start'] for subtitle in translated_subtitles]
+    original_starts = [subtitle['start'] for subtitle in original_subtitles]
+
+    paired_data = []
+    for screenshot, current_time, next_time in zip(screenshots, times, bounds):
+        paired_data.append({
+            'screenshot': screenshot,
+            'translated_subtitles': translated_subtitles[
+                bisect_left(translated_starts, current_time):bisect_left(translated_starts, next_time)],
+            'original_subtitles': original_subtitles[
+                bisect_left(original_starts, current_time):bisect_left(original_starts, next_time)]
+        })
+    return paired_data
+
+
+@lru_cache(maxsize=PAIRING_CACHE_SIZE)
+def load_paired_data(youtube_id, processed_at):
+    """從資料庫讀取截圖與字幕並配對。
+
+    以 (youtube_id, processed_at) 為快取鍵：重新處理影片會更新 processed_at，舊的結果自然不再被使用。
+    """
+    return pair_screenshots(get_screenshots(youtube_id), get_cues(youtube_id, 'translation'),
+                            get_cues(youtube_id, 'transcription'))
@@ -0,0 +1,167 @@
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from utils.audio import SAMPLE_RATE, AUDIO_CHUNK_SECONDS, iter_audio_chunks
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# 轉錄後端：'mlx'（Apple silicon）、'faster-whisper'（CPU, CTranslate2 int8）、'stub'（測試用，不需模型）
+TRANSCRIBER_BACKEND = 'mlx'
+WHISPER_MODEL_SIZE = 'large-v3'
+FASTER_WHISPER_COMPUTE_TYPE = 'int8'
+
+# 分段並行轉錄：在靜音處切分長音訊，以多個進程同時轉錄
+CHUNKED_TRANSCRIPTION = False
+TRANSCRIBE_WORKERS = 2
+TARGET_CHUNK_SECONDS = 300  # 目標分段長度
+SILENCE_SEARCH_SECONDS = 30  # 在目標切點前多少秒內尋找最安靜的位置
+SILENCE_FRAME_SECONDS = 0.1  # 計算音量的幀長
+
+_transcribers = {}
+
+
+class Transcriber:
+    """轉錄後端介面：transcribe() 接收 16kHz float32 陣列，返回 {'segments': [...], 'language': ...}。"""
+
+    def __init__(self, model_size):
+        self.model_size = model_size
+
+    def transcribe(self, samples, language=None):
+        raise NotImplementedError
+
+
+class MlxTranscriber(Transcriber):
+    def transcribe(self, samples, language=None):
+        import mlx_whisper
+        decode_options = {'language': language} if language else {}
+        result = mlx_whisper.transcribe(samples, path_or_hf_repo=f"mlx-community/whisper-{self.model_size}-mlx",
+                                        **decode_options)
+        return {'segments': result['segments'], 'language': result.get('language')}
+
+
+class FasterWhisperTranscriber(Transcriber):
+    def __init__(self, model_size):
+        super().__init__(model_size)
+        from faster_whisper import WhisperModel
+        self.model = WhisperModel(model_size, device='cpu', compute_type=FASTER_WHISPER_COMPUTE_TYPE)
+
+    def transcribe(self, samples, language=None):
+        segments, info = self.model.transcribe(samples, language=language)
+        return {
+            'segments': [{'start': s.start, 'end': s.end, 'text': s.text} for s in segments],
+            'language': info.language
+        }
+
+
+class StubTranscriber(Transcriber):
+    """不載入任何模型，每 5 秒產生一個固定內容的片段，供測試與開發使用。"""
+
+    def transcribe(self, samples, language=None):
+        duration = len(samples) / SAMPLE_RATE
+        segments = []
+        start = 0.0
+        while start < duration:
+            end = min(start + 5.0, duration)
+            segments.append({'start': start, 'end': end, 'text': f"stub segment {len(segments) + 1}"})
+            start = end
+        return {'segments': segments, 'language': language or 'en'}
+
+
+BACKENDS = {
+    'mlx': MlxTranscriber,
+    'faster-whisper': FasterWhisperTranscriber,
+    'stub': StubTranscriber,
+}
+
+
+def get_transcriber(backend=None, model_size=None):
+    """返回指定後端的轉錄器；模型載入成本高，同一進程內會重複使用。"""
+    backend = backend or TRANSCRIBER_BACKEND
+    model_size = model_size or WHISPER_MODEL_SIZE
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的轉錄後端: {backend}")
+    key = (backend, model_size)
+    if key not in _transcribers:
+        logger.info(f"載入轉錄模型: {backend} / {model_size}")
+        _transcribers[key] = BACKENDS[backend](model_size)
+    return _transcribers[key]
+
+
+def find_silence_split(samples, target_index, search_samples):
+    """在 target_index 之前 search_samples 範圍內找出音量最低的幀，返回該幀的中點作為切點。"""
+    frame = int(SILENCE_FRAME_SECONDS * SAMPLE_RATE)
+    search_start = max(0, target_index - search_samples)
+    window = samples[search_start:target_index]
+    frame_count = len(window) // frame
+    if frame_count == 0:
+        return target_index
+    energy = np.square(window[:frame_count * frame].reshape(frame_count, frame)).mean(axis=1)
+    quietest = int(np.argmin(energy))
+    return search_start + quietest * frame + frame // 2
+
+
+def iter_silence_chunks(audio_path, target_seconds=None):
+    """逐段讀取音訊並在接近 target_seconds 的靜音處切分，產生 (起始秒數, 樣本陣列)。"""
+    target = int((target_seconds or TARGET_CHUNK_SECONDS) * SAMPLE_RATE)
+    search = int(SILENCE_SEARCH_SECONDS * SAMPLE_RATE)
+    buffer = np.zeros(0, dtype=np.float32)
+    buffer_offset = 0
+    for _, samples in iter_audio_chunks(audio_path, target_seconds or TARGET_CHUNK_SECONDS):
+        buffer = np.concatenate([buffer, samples])
+        while len(buffer) >= target + search:
+            split = find_silence_split(buffer, target, search)
+            yield buffer_offset / SAMPLE_RATE, buffer[:split]
+            buffer = buffer[split:]
+            buffer_offset += split
+    if len(buffer):
+        yield buffer_offset / SAMPLE_RATE, buffer
+
+
+def _transcribe_chunk(backend, model_size, samples, language):
+    # 在子進程中執行，每個進程各自載入一次模型
+    return get_transcriber(backend, model_size).transcribe(samples, language)
+
+
+def _shift_segments(result, offset):
+    return [{'start': s['start'] + offset, 'end': s['end'] + offset, 'text': s['text']}
+            for s in result['segments']]
+
+
+def transcribe_audio(audio_path, language=None, backend=None, model_size=None, chunked=None):
+    """轉錄音訊檔，返回 {'segments': [...], 'language': ...}，片段時間已換算為整段音訊的時間。"""
+    backend = backend or TRANSCRIBER_BACKEND
+    model_size = model_size or WHISPER_MODEL_SIZE
+    chunked = CHUNKED_TRANSCRIPTION if chunked is None else chunked
+
+    segments = []
+    if not chunked:
+        transcriber = get_transcriber(backend, model_size)
+        # 視窗同樣在靜音處切分，避免在句子中間硬切而截斷或遺漏邊界上的字詞
+        for offset, samples in iter_silence_chunks(audio_path, AUDIO_CHUNK_SECONDS):
+            result = transcriber.transcribe(samples, language)
+            # 後續視窗沿用第一段偵測到的語言，避免中途切換
+            language = language or result['language']
+            segments.extend(_shift_segments(result, offset))
+        return {'segments': segments, 'language': language}
+
+    # 以 spawn 啟動子進程，避免 fork 後共用模型或 GPU 狀態
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=TRANSCRIBE_WORKERS, mp_context=context) as executor:
+        pending = []
+        results = []
+        for offset, samples in iter_silence_chunks(audio_path):
+            pending.append((offset, executor.submit(_transcribe_chunk, backend, model_size, samples, language)))
+            # 限制排隊中的分段數，讓記憶體用量維持在數個分段以內
+            while len(pending) >= TRANSCRIBE_WORKERS * 2:
+                chunk_offset, future = pending.pop(0)
+                results.append((chunk_offset, future.result()))
+        results.extend((chunk_offset, future.result()) for chunk_offset, future in pending)
+
+    for offset, result in results:
+        language = language or result['language']
+        segments.extend(_shift_segments(result, offset))
+    logger.info(f"分段轉錄完成: {len(results)} 段，{len(segments)} 個片段")
+    return {'segments': segments, 'language': language}
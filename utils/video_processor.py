@@ -1,13 +1,21 @@
 import os
+import copy
+import glob
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from openai import OpenAI
 import yt_dlp
-import cv2
-import subprocess
 from datetime import datetime
-from utils.image_processor import remove_duplicate_images
-from utils.vtt_translator import translate_and_summarize, process_vtt, extract_text_from_vtt, detect_language
-from database import get_all_videos 
-import mlx_whisper
+from utils import frame_sampler, metrics, transcriber, vtt_translator
+from utils.frame_sampler import extract_screenshots
+from utils.transcriber import transcribe_audio
+from utils.workspace import create_work_dir, cleanup_work_dir
+from utils.vtt_translator import process_vtt, extract_text_from_vtt, extract_cue_texts, summarize_cues
+from utils.vtt import Cues, parse_vtt, format_vtt_timestamp
+from utils.checkpoints import StageCheckpoints, content_digest, fingerprint
+from utils.language import LanguageResolver
+from database import get_screenshots
 import logging
 
 
@@ -15,51 +23,33 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def cleanup_temp_files():
-    temp_files = ['temp_video.mp4', 'temp_audio.mp3'] + [f"temp_video.{lang}.vtt" for lang in ['zh-TW','zh-Hant', 'en', 'ko', 'ja']]
-    for file in temp_files:
-        if os.path.exists(file):
-            os.remove(file)
-            logger.info(f"Removed temporary file: {file}")
-
-
-def extract_audio(input_video_path, output_audio_path):
-    # 如果文件已存在，可以选择先删除或者重命名
-    if os.path.exists(output_audio_path):
-        os.remove(output_audio_path)
-    """從視頻中提取音頻並保存為 MP3 文件。"""
-    command = [
-        'ffmpeg',
-        '-i',
-        input_video_path,
-        '-ar',
-        '16000',  # 設置取樣率為 16000Hz
-        '-ab',
-        '128k',  # 128 kbps
-        '-ac',
-        '1',  # 設置聲道為單聲道
-        output_audio_path
-    ]
+SUBTITLE_LANGS = ['zh-TW','zh-Hant', 'en', 'ko', 'ja']
 
-    try:
-        subprocess.run(command, check=True)
-        print(f"Successfully extracted audio to {output_audio_path}")
-        return output_audio_path  # 返回音頻文件路徑
-    except subprocess.CalledProcessError as e:
-        print(f"Error during audio extraction: {e}")
-        return None  # 返回 None 代表提取失敗
-
-def format_timestamp(seconds):
-    """將秒數轉換為 VTT 格式的時間戳"""
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    seconds = seconds % 60
-    milliseconds = int((seconds - int(seconds)) * 1000)
-    return f"{hours:02d}:{minutes:02d}:{int(seconds):02d}.{milliseconds:03d}"
+# 下載設定：截圖只需中等解析度的純視訊串流，轉錄只需純音訊串流
+SCREENSHOT_MAX_HEIGHT = 720
+DOWNLOAD_PROFILES = {
+    'video': 'bestvideo[height<={height}][ext=mp4]/bestvideo[height<={height}]/best[height<={height}]/best',
+    'audio': 'bestaudio[ext=m4a]/bestaudio/best',
+}
+
+
+def cleanup_temp_files(work_dir):
+    cleanup_work_dir(work_dir)
+
+
+def segments_to_vtt(segments):
+    """將轉錄結果的片段轉換為 VTT 格式的字符串。"""
+    cues = Cues()
+    for segment in segments:
+        cues.append(segment['start'], segment['end'], segment['text'].strip())
+    return cues.to_vtt()
 
 
 def transcribe_audio_with_whisper(audio_path, language=None):
-    """使用 mlx-whisper 進行音頻轉錄，並返回 VTT 格式的字符串。"""
+    """使用設定的轉錄後端（見 utils.transcriber）進行音頻轉錄，返回 (VTT 格式的字符串, 語言代碼)。
+
+    音訊由 ffmpeg 直接解碼為 16kHz PCM 並逐段送入模型，不產生中間的 MP3 檔案。
+    """
     try:
         if not os.path.exists(audio_path):
             raise ValueError(f"音頻文件 '{audio_path}' 不存在。")
@@ -70,154 +60,327 @@ def transcribe_audio_with_whisper(audio_path, language=None):
         if file_size == 0:
             raise ValueError(f"音頻文件 '{audio_path}' 為空。")
 
-        # 初始化 mlx-whisper 模型
-        # model = WhisperModel('small')  # 可以選擇 'tiny', 'base', 'small', 'medium', 'large'
-
-        # 使用 mlx-whisper 模型x``進行轉錄
-        result = mlx_whisper.transcribe(audio_path, path_or_hf_repo="mlx-community/whisper-large-v3-mlx")
-
-        # 將結果轉換為 VTT 格式的字符串
-        transcription = "WEBVTT\n\n"
-        for segment in result["segments"]:
-            start = format_timestamp(segment['start'])
-            end = format_timestamp(segment['end'])
-            text = segment['text'].strip()
-            transcription += f"{start} --> {end}\n{text}\n\n"
+        result = transcribe_audio(audio_path, language)
+        transcription = segments_to_vtt(result['segments'])
 
         print("轉錄完成。")
         print("VTT 內容預覽:", transcription[:200] + "..." if len(transcription) > 200 else transcription)
 
-        return transcription
+        return transcription, result['language']
 
     except Exception as e:
         print(f"轉錄過程中發生錯誤: {str(e)}")
-    return None
+    return None, None
+
+
+def emit_event(progress_callback, event_type, **data):
+    """以 {'type': event_type, ...} 字典通知呼叫端處理事件（階段切換、部分翻譯、截圖、摘要等）。"""
+    if progress_callback is not None:
+        progress_callback({'type': event_type, **data})
+
+
+def report_progress(progress_callback, stage, progress):
+    """通知呼叫端目前的處理階段與進度百分比（0-100）。"""
+    logger.info(f"處理階段: {stage} ({progress}%)")
+    emit_event(progress_callback, 'stage', stage=stage, progress=progress)
+
+
+@contextmanager
+def stage_timer(timings, stage):
+    """記錄一個處理階段的耗時（秒）到 timings 與 utils.metrics 的階段直方圖；同一階段多次計時時累加。"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        timings[stage] = round(timings.get(stage, 0) + elapsed, 3)
+        metrics.observe_stage(stage, elapsed)
+        logger.info(f"階段 {stage} 耗時 {timings[stage]:.2f} 秒")
+
+
+def fetch_metadata(youtube_url):
+    """只取得影片資訊（不下載任何媒體），用於決定需要下載哪些串流。"""
+    with yt_dlp.YoutubeDL({'quiet': True}) as ydl:
+        return ydl.extract_info(youtube_url, download=False)
+
 
+def has_usable_subtitles(info):
+    return any(lang in (info.get('subtitles') or {}) for lang in SUBTITLE_LANGS)
 
-def process_video(youtube_url, output_folder, capture_interval=10):
+
+def download_subtitles(info, work_dir):
+    """只下載字幕檔（skip_download），不下載影音串流。"""
     ydl_opts = {
-        'format': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best',
-        'outtmpl': 'temp_video.%(ext)s',
+        'outtmpl': os.path.join(work_dir, 'video.%(ext)s'),
+        'skip_download': True,
         'writesubtitles': True,
-        'subtitleslangs': ['zh-TW','zh-Hant', 'en', 'ko', 'ja'],
+        'subtitleslangs': SUBTITLE_LANGS,
     }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        ydl.process_ie_result(copy.deepcopy(info), download=True)
 
-    try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(youtube_url, download=True)
-            video_title = info['title']
-            video_id = info['id']
-            video_description = info.get('description', '')
-            video_creator = info.get('uploader', '')
-            video_timestamp = datetime.fromtimestamp(info.get('timestamp', 0)).isoformat()
-            video_duration = info.get('duration_string', '')
-            video_language = info.get('language', '') or detect_language(video_title + ' ' + video_description)
-
-        logger.info(f"視頻下載完成: {video_title}")
-
-        if not os.path.exists('temp_video.mp4'):
-            raise FileNotFoundError("視頻文件未成功下載")
-
-        subtitle_path = None
-        subtitle_used = False
-
-        for lang in ['zh-TW','zh-Hant', 'en', 'ko', 'ja']:
-            potential_subtitle_path = f"temp_video.{lang}.vtt"
-            if os.path.exists(potential_subtitle_path):
-                subtitle_path = potential_subtitle_path
-                subtitle_used = True
-                logger.info(f"找到{get_language_name(lang)}字幕: {subtitle_path}")
-                break
-
-        if subtitle_used and os.path.exists(subtitle_path) and os.path.getsize(subtitle_path) > 0:
+
+def download_media(info, work_dir, profile, max_height=None):
+    """依下載設定（'video' 或 'audio'）下載單一串流，返回下載的檔案路徑。"""
+    ydl_opts = {
+        'format': DOWNLOAD_PROFILES[profile].format(height=max_height or SCREENSHOT_MAX_HEIGHT),
+        'outtmpl': os.path.join(work_dir, f'{profile}.%(ext)s'),
+    }
+    # 兩個分支可能同時下載，各自使用一份 info 的副本
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        ydl.process_ie_result(copy.deepcopy(info), download=True)
+
+    for path in glob.glob(os.path.join(work_dir, f'{profile}.*')):
+        if not path.endswith(('.part', '.vtt', '.ytdl')):
+            logger.info(f"{profile} 串流下載完成: {path}")
+            return path
+    raise FileNotFoundError(f"{profile} 串流未成功下載")
+
+
+def find_subtitle(work_dir):
+    """依語言優先順序尋找 yt-dlp 下載的非空字幕檔，返回 (路徑, 語言代碼)，找不到時返回 (None, None)。"""
+    for lang in SUBTITLE_LANGS:
+        subtitle_path = os.path.join(work_dir, f"video.{lang}.vtt")
+        if os.path.exists(subtitle_path) and os.path.getsize(subtitle_path) > 0:
+            logger.info(f"找到{get_language_name(lang)}字幕: {subtitle_path}")
+            return subtitle_path, lang
+    return None, None
+
+
+def download_stream(info, checkpoints, work_dir, profile, timings, max_height=None, stage=None):
+    """下載單一串流並移入檢查點的串流目錄；相同格式的串流已存在時直接沿用，返回檔案路徑。
+
+    下載耗時記錄為 stage 階段（預設為 download_<profile>）。
+
+    先下載到任務自己的暫存目錄（計入暫存區大小上限），完成後才以 os.replace 原子地移入共用的串流目錄，
+    同一支影片的並行任務不會讀到下載到一半的檔案，也不會刪除彼此正在讀取的串流。
+    """
+    stream_format = DOWNLOAD_PROFILES[profile].format(height=max_height or SCREENSHOT_MAX_HEIGHT)
+    params = {'youtube_id': info['id'], 'format': stream_format}
+
+    def download():
+        with stage_timer(timings, stage or f'download_{profile}'):
+            path = download_media(info, work_dir, profile, max_height)
+        # 檔名含格式的指紋，不同格式的串流並存，舊格式的檔案隨目錄由 prune_media 淘汰
+        cached_path = os.path.join(checkpoints.media_dir,
+                                   f"{profile}-{fingerprint(params)[:12]}{os.path.splitext(path)[1]}")
+        os.replace(path, cached_path)
+        return {'path': cached_path}
+
+    output = checkpoints.run(f'download_{profile}', params, download, valid=lambda output: os.path.exists(output['path']))
+    return output['path']
+
+
+def transcript_params(info):
+    """逐字稿階段的指紋參數：有字幕時取決於字幕語言清單，否則取決於音訊格式與轉錄模型。"""
+    if has_usable_subtitles(info):
+        return {'source': 'subtitles', 'youtube_id': info['id'], 'langs': SUBTITLE_LANGS}
+    return {'source': 'whisper', 'youtube_id': info['id'], 'format': DOWNLOAD_PROFILES['audio'],
+            'backend': transcriber.TRANSCRIBER_BACKEND, 'model': transcriber.WHISPER_MODEL_SIZE}
+
+
+def process_text(info, work_dir, timings, progress_callback=None, resolver=None, checkpoints=None):
+    """文字分支：字幕或（純音訊下載 → 轉錄）→ 翻譯 → 摘要，返回 transcription/translation/summary/subtitle_used。
+
+    語言優先取自字幕檔名或 whisper 的偵測結果，只有兩者皆無時才由 resolver 偵測。
+    逐字稿、翻譯與摘要各自是一個檢查點階段，下游的指紋包含上游輸出的內容雜湊。
+    """
+    resolver = resolver or LanguageResolver()
+    checkpoints = checkpoints or StageCheckpoints(info['id'])
+    failure = {'transcription': '', 'translation': "轉錄失敗", 'summary': "無法生成摘要", 'subtitle_used': False}
+
+    def transcribe():
+        subtitle_path, language_code = None, None
+        if has_usable_subtitles(info):
+            with stage_timer(timings, 'download'):
+                download_subtitles(info, work_dir)
+            subtitle_path, language_code = find_subtitle(work_dir)
+
+        if subtitle_path:
             logger.info(f"開始處理字幕檔案: {subtitle_path}")
             with open(subtitle_path, 'r', encoding='utf-8') as file:
-                subtitle_content = file.read()
-            
-            detected_language = detect_language(extract_text_from_vtt(subtitle_content))
-            translated_vtt, translated_text = process_vtt(subtitle_content, detected_language)
-            _, summary = translate_and_summarize(translated_text)
-        
-            transcription = subtitle_content
-            translation = translated_vtt
-
+                transcription = file.read()
         else:
-            subtitle_used = False
-            logger.info("沒有找到合適的字幕檔案，將進行音頻提取和轉錄")
-            input_video_path = 'temp_video.mp4'
-            output_audio_path = 'temp_audio.mp3'
-            audio_path = extract_audio(input_video_path, output_audio_path)
-
-            if audio_path and os.path.exists(audio_path):
-                logger.info(f"開始處理音頻: {audio_path}")
-                transcription = transcribe_audio_with_whisper(audio_path)
-                if transcription:
-                    detected_language = detect_language(extract_text_from_vtt(transcription))
-                    logger.info(f"檢測到的語言: {detected_language}")
-                    
-                    translated_vtt, translated_text = process_vtt(transcription, detected_language)
-                    logger.info(f"翻譯後的VTT文本 (前100字符): {translated_vtt[:100]}...")
-                    logger.info(f"翻譯後的文本 (前100字符): {translated_text[:100]}...")
-                    
-                    _, summary = translate_and_summarize(translated_text)
-                    translation = translated_vtt
-                    
-                    logger.info(f"翻譯後的摘要 (前100字符): {summary[:100]}...")
-                
-                else:
-                    logger.error("轉錄失敗")
-                    translation, summary = "轉錄失敗", "無法生成摘要"
-            else:
-                logger.error(f"音頻提取失敗或文件不存在: {output_audio_path}")
-                translation, summary = "音頻提取失敗", "無法生成摘要"
+            logger.info("沒有找到合適的字幕檔案，將下載音訊串流並進行轉錄")
+            report_progress(progress_callback, 'downloading_audio', 20)
+            try:
+                audio_path = download_stream(info, checkpoints, work_dir, 'audio', timings, stage='download')
+            except Exception as e:
+                logger.error(f"音訊下載失敗: {str(e)}")
+                failure['translation'] = "音頻提取失敗"
+                return None
+
+            logger.info(f"開始處理音頻: {audio_path}")
+            report_progress(progress_callback, 'transcribing', 25)
+            with stage_timer(timings, 'transcribe'):
+                transcription, language_code = transcribe_audio_with_whisper(audio_path)
+            if not transcription:
+                logger.error("轉錄失敗")
+                return None
+        return {'transcription': transcription, 'language_code': language_code,
+                'subtitle_used': subtitle_path is not None}
+
+    transcript = checkpoints.run('transcript', transcript_params(info), transcribe)
+    if transcript is None:
+        return failure
+    transcription = transcript['transcription']
+
+    def translate():
+        with stage_timer(timings, 'translate'):
+            detected_language = resolver.resolve(extract_text_from_vtt(transcription), transcript['language_code'])
+            logger.info(f"檢測到的語言: {detected_language}")
+
+            def on_cues(done, total, cues):
+                # 翻譯佔 45% 到 60% 的進度區間
+                emit_event(progress_callback, 'cues', done=done, total=total, cues=cues,
+                           progress=round(45 + 15 * done / max(total, 1), 1))
+
+            translated_vtt, _ = process_vtt(transcription, detected_language, on_cues)
+        return {'translation': translated_vtt}
+
+    report_progress(progress_callback, 'translating', 45)
+    translation_params = {'transcript': content_digest(transcription), 'language_code': transcript['language_code'],
+                          'model': vtt_translator.MODEL_NAME}
+    translated_vtt = checkpoints.run('translation', translation_params, translate)['translation']
+    if 'translation' in checkpoints.reused:
+        # 沿用檢查點時沒有逐批的翻譯進度，一次送出全部字幕
+        cues = [{'index': index, 'start': format_vtt_timestamp(cue['start']),
+                 'end': format_vtt_timestamp(cue['end']), 'text': cue['text']}
+                for index, cue in enumerate(parse_vtt(translated_vtt))]
+        emit_event(progress_callback, 'cues', done=len(cues), total=len(cues), cues=cues, progress=60)
+    logger.info(f"翻譯後的VTT文本 (前100字符): {translated_vtt[:100]}...")
+
+    def summarize():
+        with stage_timer(timings, 'summarize'):
+            # process_vtt 的輸出一律為繁體中文，直接沿字幕邊界分段摘要
+            return {'summary': summarize_cues(extract_cue_texts(translated_vtt))}
+
+    report_progress(progress_callback, 'summarizing', 60)
+    summary_params = {'translation': content_digest(translated_vtt), 'model': vtt_translator.MODEL_NAME}
+    summary = checkpoints.run('summary', summary_params, summarize)['summary']
+    logger.info(f"翻譯後的摘要 (前100字符): {summary[:100]}...")
+    emit_event(progress_callback, 'summary', summary=summary)
+
+    return {
+        'transcription': transcription,
+        'translation': translated_vtt,
+        'summary': summary,
+        'subtitle_used': transcript['subtitle_used']
+    }
+
+
+def process_screenshots(info, work_dir, output_folder, capture_interval, sampling_mode, min_scene_gap, adjacent_only,
+                        max_height, timings, progress_callback=None, checkpoints=None):
+    """截圖分支：下載純視訊串流 → 移除舊截圖 → 取樣（含去重複），返回截圖資訊列表。
+
+    指紋涵蓋視訊格式與取樣參數；相符且截圖檔案仍存在時不下載也不重新取樣。
+    """
+    video_id = info['id']
+    checkpoints = checkpoints or StageCheckpoints(video_id)
+
+    def capture():
+        video_path = download_stream(info, checkpoints, work_dir, 'video', timings, max_height)
 
-        # 處理影片截圖
         logger.info("開始處理影片截圖")
-        # 檢查視頻是否已存在於資料庫
-        existing_video = get_all_videos(youtube_id=video_id)
-        if existing_video:
-            # 移除現有的截圖
-            for screenshot in existing_video['screenshots']:
-                filepath = os.path.join(output_folder, screenshot['filename'])
-                if os.path.exists(filepath):
-                    os.remove(filepath)
-                    logger.info(f"移除舊的截圖: {filepath}")
-
-        video = cv2.VideoCapture('temp_video.mp4')
-        if not video.isOpened():
-            raise IOError("無法打開視頻文件")
-
-        fps = video.get(cv2.CAP_PROP_FPS)
-        total_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
-
-        logger.info(f"視頻 FPS: {fps}, 總幀數: {total_frames}")
-
-        screenshots = []
-        step = int(fps * capture_interval)
-        if step <= 0:
-            logger.warning(f"Invalid step size calculated: {step}. Using default step of 1 second.")
-            step = int(fps) if fps > 0 else 30  # 假設 30fps 如果無法獲取 fps
-
-        for i in range(0, total_frames, step):
-            video.set(cv2.CAP_PROP_POS_FRAMES, i)
-            success, frame = video.read()
-            if success:
-                timestamp = i / fps if fps > 0 else i / 30
-                filename = f"{video_id}_{timestamp:.2f}.jpg"
-                filepath = os.path.join(output_folder, filename)
-                cv2.imwrite(filepath, frame)
-                screenshots.append({
-                    'filename': filename,
-                    'timestamp': f"{timestamp:.2f}s"
-                })
-                logger.info(f"截圖保存: {filepath}")
-
-        video.release()
-
-        # 移除重複的圖像
-        screenshots = remove_duplicate_images(output_folder, screenshots)
-        logger.info(f"去重後的截圖數量: {len(screenshots)}")
-        logging.info(f"翻譯內容 (first 100 characters): {translation[:100]}")
+        # 移除資料庫中記錄的舊截圖
+        for screenshot in get_screenshots(video_id):
+            filepath = os.path.join(output_folder, screenshot['filename'])
+            if os.path.exists(filepath):
+                os.remove(filepath)
+                logger.info(f"移除舊的截圖: {filepath}")
+
+        # 取樣與去重複的耗時由 extract_screenshots 分別記錄為 screenshots 與 dedup 階段
+        screenshots = extract_screenshots(video_path, output_folder, video_id, capture_interval, sampling_mode,
+                                          min_scene_gap=min_scene_gap, adjacent_only=adjacent_only, timings=timings)
+        return {'screenshots': screenshots}
+
+    params = {
+        'youtube_id': video_id,
+        'format': DOWNLOAD_PROFILES['video'].format(height=max_height or SCREENSHOT_MAX_HEIGHT),
+        'capture_interval': capture_interval,
+        'sampling_mode': sampling_mode or frame_sampler.SAMPLING_MODE,
+        'min_scene_gap': min_scene_gap or frame_sampler.SCENE_MIN_GAP,
+        'scene_threshold': frame_sampler.SCENE_THRESHOLD,
+        'dedup': (frame_sampler.DEDUP_HASH_SIZE, frame_sampler.DEDUP_SIMILARITY_THRESHOLD, adjacent_only),
+    }
+    screenshots = checkpoints.run(
+        'screenshots', params, capture,
+        valid=lambda output: all(os.path.exists(os.path.join(output_folder, screenshot['filename']))
+                                 for screenshot in output['screenshots']))['screenshots']
+    logger.info(f"去重後的截圖數量: {len(screenshots)}")
+    emit_event(progress_callback, 'screenshots', count=len(screenshots), screenshots=screenshots)
+    return screenshots
+
+
+def process_video(youtube_url, output_folder, capture_interval=10, sampling_mode=None, min_scene_gap=None,
+                  progress_callback=None, capture_screenshots=True, max_height=None, adjacent_only=False):
+    """取得影片資訊後並行執行兩個分支：
+    文字分支（字幕或音訊下載 → 轉錄 → 翻譯 → 摘要）主要在等待模型伺服器，
+    截圖分支（視訊下載 → 取樣 → 去重複）主要消耗 CPU 與磁碟，兩者可完全重疊。
+    不需要截圖且有可用字幕時，只下載字幕與影片資訊。
+    各階段的輸出存為檢查點（見 utils.checkpoints）：重新處理或任務中斷後重跑時，
+    只從第一個輸入或參數改變的階段開始重做；影片資訊每次都會重新取得。
+    progress_callback 會從兩個分支的執行緒收到事件字典（見 emit_event），必須是執行緒安全的。
+    adjacent_only=True 時截圖只與上一張保留的截圖比較去重複（見 utils.image_processor.HashIndex）。
+    """
+    with metrics.recording(metrics.VideoMetrics()) as recorder:
+        result = _process_video(youtube_url, output_folder, capture_interval, sampling_mode, min_scene_gap,
+                                progress_callback, capture_screenshots, max_height, adjacent_only)
+    metrics.inc('videos_processed_total', status='failed' if 'error' in result else 'completed')
+    if 'error' not in result:
+        # 各階段耗時、模型請求、截圖數與資料庫耗時隨影片記錄保存
+        result['metrics'] = recorder.as_dict()
+    return result
+
+
+def _process_video(youtube_url, output_folder, capture_interval, sampling_mode, min_scene_gap, progress_callback,
+                   capture_screenshots, max_height, adjacent_only):
+    # 每次處理使用獨立的暫存目錄，多個影片可安全地並行處理
+    work_dir = create_work_dir()
+    timings = {}
+
+    try:
+        pipeline_start = time.perf_counter()
+        report_progress(progress_callback, 'downloading', 0)
+        with stage_timer(timings, 'metadata'):
+            info = fetch_metadata(youtube_url)
+        video_title = info['title']
+        video_id = info['id']
+        video_description = info.get('description', '')
+        video_creator = info.get('uploader', '')
+        video_timestamp = datetime.fromtimestamp(info.get('timestamp', 0)).isoformat()
+        video_duration = info.get('duration_string', '')
+
+        logger.info(f"影片資訊取得完成: {video_title}")
+        report_progress(progress_callback, 'downloaded', 15)
+        emit_event(progress_callback, 'metadata', youtube_id=video_id, title=video_title, creator=video_creator,
+                   timestamp=video_timestamp, duration=video_duration)
+
+        with StageCheckpoints(video_id) as checkpoints, \
+                ThreadPoolExecutor(max_workers=2, thread_name_prefix='stage') as executor:
+            screenshots_future = None
+            if capture_screenshots:
+                screenshots_future = executor.submit(
+                    metrics.propagate(process_screenshots), info, work_dir, output_folder, capture_interval, sampling_mode,
+                    min_scene_gap, adjacent_only, max_height, timings, progress_callback, checkpoints)
+            resolver = LanguageResolver()
+            text_future = executor.submit(metrics.propagate(process_text), info, work_dir, timings, progress_callback, resolver,
+                                          checkpoints)
+            video_language = info.get('language', '') or resolver.resolve(video_title + ' ' + video_description)
+            text_result = text_future.result()
+            if screenshots_future:
+                screenshots = screenshots_future.result()
+            else:
+                # 不擷取截圖時保留既有的截圖記錄
+                screenshots = get_screenshots(video_id)
+        if checkpoints.reused:
+            logger.info(f"沿用檢查點的階段: {checkpoints.reused}")
+        report_progress(progress_callback, 'screenshots', 90)
+
+        timings['total'] = round(time.perf_counter() - pipeline_start, 3)
+        metrics.observe_stage('total', timings['total'])
+        logger.info(f"各階段耗時: {timings}")
+        logging.info(f"翻譯內容 (first 100 characters): {text_result['translation'][:100]}")
         result = {
             'title': video_title,
             'youtube_id': video_id,
@@ -228,30 +391,32 @@ def process_video(youtube_url, output_folder, capture_interval=10):
             'language': video_language,
             'processed_at': datetime.now().isoformat(),
             'screenshots': screenshots,
-            'transcription': transcription,
-            'translation': translated_vtt,
-            'summary': summary,
-            'subtitle_used': subtitle_used
+            'transcription': text_result['transcription'],
+            'translation': text_result['translation'],
+            'summary': text_result['summary'],
+            'subtitle_used': text_result['subtitle_used'],
+            'timings': timings
         }
 
-        cleanup_temp_files()
+        cleanup_temp_files(work_dir)
+        report_progress(progress_callback, 'processed', 95)
 
         return result
     
     except Exception as e:
         logger.error(f"處理視頻時發生錯誤: {str(e)}", exc_info=True)
-        cleanup_temp_files()
+        cleanup_temp_files(work_dir)
         return {
             'error': str(e),
             'youtube_id': youtube_url.split('v=')[-1] if 'v=' in youtube_url else 'unknown'
         }
 
 
-def download_subtitle(ydl, info, lang, subtitle_dict):
+def download_subtitle(ydl, info, lang, subtitle_dict, work_dir='.'):
     try:
         subtitle_url = subtitle_dict[lang][0]['url']
-        expected_filename = f"{info['id']}.{lang}.vtt"
-        actual_filename = f"temp_video.{lang}.vtt"  # yt-dlp 使用的實際文件名
+        expected_filename = os.path.join(work_dir, f"{info['id']}.{lang}.vtt")
+        actual_filename = os.path.join(work_dir, f"video.{lang}.vtt")  # yt-dlp 使用的實際文件名
 
         ydl.download([subtitle_url])
 
@@ -288,13 +453,5 @@ if __name__ == "__main__":
 
     video_info = process_video(youtube_url, output_folder, capture_interval)
 
-    # 列印結果
+    # 列印結果（暫存目錄已由 process_video 清除）
     print(video_info)
-
-    # 刪除臨時文件
-    if os.path.exists('temp_video.mp4'):
-        os.remove('temp_video.mp4')
-        print("Removed temporary video file: temp_video.mp4")
-    if os.path.exists('temp_audio.mp3'):
-        os.remove('temp_audio.mp3')
-        print("Removed temporary audio file: temp_audio.mp3")
@@ -0,0 +1,262 @@
+import re
+import html
+from array import array
+
+
+# 不含字幕的區塊
+SKIPPED_BLOCKS = ('NOTE', 'STYLE', 'REGION')
+# 行內標籤：<00:00:01.230> 逐字時間、<c>、</c>、<c.colorE5E5E5>、<i> 等
+INLINE_TAG_PATTERN = re.compile(r'<[^>]*>')
+# 逐字時間標籤，只出現在捲動顯示的自動字幕
+TIMING_TAG_PATTERN = re.compile(r'<(?:\d+:)?\d{2}:\d{2}\.\d{3}>')
+SENTENCE_END_CHARS = ('.', '?', '!', '。', '？', '！', '…', '"', '」')
+CJK_CHAR_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]')
+
+# 合併字幕的條件：與前一句間隔不超過 MERGE_MAX_GAP 時，短於 MERGE_MIN_SECONDS 的字幕併入前一句；
+# 未以句尾標點結束的片段會繼續合併，直到長度達到 MERGE_MAX_SECONDS；合併後的字數不超過 MERGE_MAX_CHARS
+MERGE_MIN_SECONDS = 1.0
+MERGE_MAX_SECONDS = 10.0
+MERGE_MAX_CHARS = 200
+MERGE_MAX_GAP = 1.5
+# 捲動字幕去重時比對的最近行數
+ROLLING_WINDOW = 3
+# 沒有逐字時間標籤時，超過半數的字幕首行重複前一條的末行、且與前一條相接（間隔不超過 ROLLING_MAX_GAP 秒）才視為捲動字幕
+ROLLING_MAX_GAP = 0.1
+
+
+class Cues:
+    """以平行陣列儲存的字幕：starts / ends 為秒數（array('d')），texts 為文字列表。
+
+    比每條字幕一個字典精簡，解析、正規化、翻譯與寫入資料庫都共用這個結構；
+    索引與迭代時返回 {'start', 'end', 'text'} 字典。
+    """
+    __slots__ = ('starts', 'ends', 'texts')
+
+    def __init__(self):
+        self.starts = array('d')
+        self.ends = array('d')
+        self.texts = []
+
+    @classmethod
+    def from_dicts(cls, cues):
+        result = cls()
+        for cue in cues:
+            result.append(cue['start'], cue['end'], cue['text'])
+        return result
+
+    def append(self, start, end, text):
+        self.starts.append(start)
+        self.ends.append(end)
+        self.texts.append(text)
+
+    def with_texts(self, texts):
+        """返回時間相同、文字替換為 texts 的新字幕（如翻譯結果）。"""
+        result = Cues()
+        result.starts = array('d', self.starts)
+        result.ends = array('d', self.ends)
+        result.texts = list(texts)
+        return result
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __getitem__(self, index):
+        return {'start': self.starts[index], 'end': self.ends[index], 'text': self.texts[index]}
+
+    def __iter__(self):
+        for start, end, text in zip(self.starts, self.ends, self.texts):
+            yield {'start': start, 'end': end, 'text': text}
+
+    def to_vtt(self):
+        """序列化為 VTT 字串。"""
+        blocks = [f"{format_vtt_timestamp(start)} --> {format_vtt_timestamp(end)}\n{text}"
+                  for start, end, text in zip(self.starts, self.ends, self.texts)]
+        return 'WEBVTT\n\n' + '\n\n'.join(blocks)
+
+
+def parse_timestamp(timestamp):
+    """將 'HH:MM:SS.mmm' 或 'MM:SS.mmm' 轉換為秒數（也接受 SRT 的逗號小數點）；格式錯誤時拋出 ValueError。"""
+    parts = timestamp.replace(',', '.').split(':')
+    if len(parts) == 3:
+        return int(parts[0]) * 3600 + int(parts[1]) * 60 + float(parts[2])
+    if len(parts) == 2:
+        return int(parts[0]) * 60 + float(parts[1])
+    raise ValueError(f"無效的時間戳: {timestamp}")
+
+
+def format_vtt_timestamp(seconds):
+    """將秒數轉換為 'HH:MM:SS.mmm'。"""
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}"
+
+
+def _parse_block(block):
+    # 時間行之前最多一行 cue 識別碼；檔頭區塊若緊接字幕（沒有空行）也能解析
+    if block[0].lstrip('\ufeff').startswith('WEBVTT'):
+        candidates = range(1, len(block))
+    elif block[0].split(' ', 1)[0] in SKIPPED_BLOCKS:
+        return None
+    else:
+        candidates = range(min(2, len(block)))
+
+    for index in candidates:
+        line = block[index]
+        if '-->' not in line:
+            continue
+        start, _, rest = line.partition('-->')
+        settings = rest.split()
+        if not settings:
+            return None
+        try:
+            # 結束時間之後的 cue 設定（align:start position:0% 等）不影響內容，予以忽略
+            return parse_timestamp(start.strip()), parse_timestamp(settings[0]), '\n'.join(block[index + 1:]).strip()
+        except ValueError:
+            return None
+    return None
+
+
+def iter_cues(lines):
+    """逐行解析 VTT，產生 (start, end, text)；lines 可為檔案物件或任何字串行的可迭代物件。
+
+    略過檔頭與 NOTE / STYLE / REGION 區塊，支援 cue 識別碼、cue 設定與省略小時的時間戳。
+    區塊以空行分隔；只含空白的行（YouTube 自動字幕常見）屬於字幕內容。
+    """
+    block = []
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line:
+            block.append(line)
+            continue
+        if block:
+            cue = _parse_block(block)
+            if cue is not None:
+                yield cue
+            block = []
+    if block:
+        cue = _parse_block(block)
+        if cue is not None:
+            yield cue
+
+
+def parse_vtt(source):
+    """解析 VTT 字串或已開啟的檔案，返回 Cues。"""
+    cues = Cues()
+    if not source:
+        return cues
+    lines = source.split('\n') if isinstance(source, str) else source
+    for start, end, text in iter_cues(lines):
+        cues.append(start, end, text)
+    return cues
+
+
+def parse_vtt_file(path):
+    with open(path, 'r', encoding='utf-8-sig') as file:
+        return parse_vtt(file)
+
+
+def parse_cues(vtt_content):
+    """解析 VTT 字幕，返回 {'start', 'end', 'text'} 字典列表（時間以秒為單位）。"""
+    return list(parse_vtt(vtt_content))
+
+
+def cues_to_vtt(cues):
+    """將 Cues 或 {'start', 'end', 'text'} 字典列表轉換為 VTT 字串。"""
+    if not isinstance(cues, Cues):
+        cues = Cues.from_dicts(cues)
+    return cues.to_vtt()
+
+
+def strip_inline_tags(text):
+    """移除行內時間與樣式標籤並還原 HTML 實體。"""
+    return html.unescape(INLINE_TAG_PATTERN.sub('', text))
+
+
+def _clean_lines(text):
+    return [line for line in (' '.join(line.split()) for line in strip_inline_tags(text).split('\n')) if line]
+
+
+def is_rolling_captions(cues):
+    """判斷字幕是否為捲動顯示的自動字幕：含逐字時間標籤，或多數字幕以前一條的末行開頭且時間相接。"""
+    if any(TIMING_TAG_PATTERN.search(text) for text in cues.texts):
+        return True
+    carried = 0
+    previous_lines = []
+    for index, text in enumerate(cues.texts):
+        lines = _clean_lines(text)
+        if (len(lines) > 1 and previous_lines and lines[0] == previous_lines[-1]
+                and cues.starts[index] <= cues.ends[index - 1] + ROLLING_MAX_GAP):
+            carried += 1
+        previous_lines = lines
+    return carried * 2 > len(cues) - 1 > 0
+
+
+def collapse_rolling_cues(cues):
+    """去除自動字幕的捲動重複：每條字幕只保留最近幾行未出現過的新行，沒有新行的字幕併入前一條的時間範圍。
+
+    只適用於捲動字幕（見 is_rolling_captions）；一般字幕中真正重複的句子（如連續兩句 "Yes."）也會被移除。
+    """
+    collapsed = Cues()
+    recent = []
+    for start, end, text in zip(cues.starts, cues.ends, cues.texts):
+        new_lines = [line for line in _clean_lines(text) if line not in recent]
+        for line in new_lines:
+            recent.append(line)
+        del recent[:-ROLLING_WINDOW]
+        if new_lines:
+            collapsed.append(start, end, ' '.join(new_lines))
+        elif collapsed:
+            collapsed.ends[-1] = max(collapsed.ends[-1], end)
+    return collapsed
+
+
+def strip_carried_lines(cues):
+    """一般字幕只移除多行字幕中與前一條末行相同的首行，單獨重複的字幕（"Yes."、"[Music]"）予以保留。"""
+    stripped = Cues()
+    previous_lines = []
+    for start, end, text in zip(cues.starts, cues.ends, cues.texts):
+        lines = _clean_lines(text)
+        shown = lines[1:] if len(lines) > 1 and previous_lines and lines[0] == previous_lines[-1] else lines
+        previous_lines = lines
+        if shown:
+            stripped.append(start, end, ' '.join(shown))
+    return stripped
+
+
+def _join_text(left, right):
+    # 中日韓文字之間不加空格
+    if left and right and CJK_CHAR_PATTERN.match(left[-1]) and CJK_CHAR_PATTERN.match(right[0]):
+        return left + right
+    return f"{left} {right}"
+
+
+def merge_cues(cues):
+    """將過短或未成句的字幕合併為句子層級的字幕，時間範圍涵蓋所有被合併的字幕。"""
+    merged = Cues()
+    for start, end, text in zip(cues.starts, cues.ends, cues.texts):
+        if merged:
+            previous_text = merged.texts[-1]
+            contiguous = (start - merged.ends[-1] <= MERGE_MAX_GAP
+                          and len(previous_text) + len(text) <= MERGE_MAX_CHARS)
+            short = end - start < MERGE_MIN_SECONDS
+            unfinished = (not previous_text.endswith(SENTENCE_END_CHARS)
+                          and end - merged.starts[-1] <= MERGE_MAX_SECONDS)
+            if contiguous and (short or unfinished):
+                merged.ends[-1] = max(merged.ends[-1], end)
+                merged.texts[-1] = _join_text(previous_text, text)
+                continue
+        merged.append(start, end, text)
+    return merged
+
+
+def normalize_cues(cues, merge=True):
+    """翻譯前的字幕正規化：移除行內標籤、去除捲動重複（只對捲動字幕），並（merge=True 時）合併為句子層級的字幕。
+
+    接受 Cues 或 {'start', 'end', 'text'} 字典列表，返回 Cues。
+    """
+    if not isinstance(cues, Cues):
+        cues = Cues.from_dicts(cues)
+    cues = collapse_rolling_cues(cues) if is_rolling_captions(cues) else strip_carried_lines(cues)
+    return merge_cues(cues) if merge else cues
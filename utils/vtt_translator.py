@@ -1,6 +1,12 @@
 import re
+import zlib
+import time
 import logging
-from openai import OpenAI
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from openai import OpenAI, APIConnectionError, InternalServerError, RateLimitError
+from utils import llm_cache, metrics
+from utils.vtt import parse_vtt, normalize_cues, format_vtt_timestamp
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -10,25 +16,90 @@ logger = logging.getLogger(__name__)
 # 全局變量用於儲存模型名稱（gemma2:9b,llama3.1:latest）
 MODEL_NAME = "gemma2:9b"
 
+# 批次翻譯設定：將多條字幕編號後合併為一次請求
+BATCH_TRANSLATION = True
+BATCH_TOKEN_BUDGET = 1500  # 每批原文的估計 token 上限
+BATCH_MAX_CUES = 50  # 每批最多字幕條數
 
-# 初始化 Ollama API 客戶端
-client = OpenAI(base_url='http://localhost:11434/v1/', api_key='ollama')
+# 並行請求設定（應與 Ollama 的 OLLAMA_NUM_PARALLEL 相符；在匯入本模組時建立信號量，執行期間不可調整）
+MAX_CONCURRENT_REQUESTS = 4
+REQUEST_TIMEOUT = 300  # 單次請求逾時秒數
+REQUEST_MAX_RETRIES = 3  # 連線錯誤或逾時的重試次數
+RETRY_BACKOFF = 2  # 重試等待秒數的基數（指數退避）
+
+# 分段摘要設定：長文字稿依 token 預算切段，各段並行摘要後再合併
+SUMMARY_CHUNK_TOKEN_BUDGET = 3000
+# 分段點由內容決定，平均每段約 SUMMARY_CHUNK_TARGET_TOKENS，且不少於 SUMMARY_CHUNK_MIN_TOKENS（預算調小時依比例縮小）
+SUMMARY_CHUNK_TARGET_TOKENS = 1500
+SUMMARY_CHUNK_MIN_TOKENS = 500
+
+
+# 初始化 Ollama API 客戶端（重試由 chat_completion 自行處理）
+client = OpenAI(base_url='http://localhost:11434/v1/', api_key='ollama', max_retries=0)
+
+# 限制同時送往模型伺服器的請求數
+_request_slots = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
 
 
 def set_model(model_name):
     global MODEL_NAME
     MODEL_NAME = model_name
     logger.info(f"Model set to: {MODEL_NAME}")
-    
+
+
+def get_request_count():
+    """程序啟動以來完成的模型請求數（不含快取命中）。"""
+    return metrics.get_value('llm_requests_total')
+
+
+def chat_completion(prompt):
+    """送出單一 prompt 並返回回覆內容；受並行上限約束，逾時或連線錯誤時以指數退避重試。
+
+    每次請求的耗時與 token 數記錄於 utils.metrics。
+    """
+    for attempt in range(REQUEST_MAX_RETRIES + 1):
+        try:
+            with _request_slots:
+                start = time.perf_counter()
+                response = client.chat.completions.create(
+                    model=MODEL_NAME,
+                    messages=[{"role": "user", "content": prompt}],
+                    timeout=REQUEST_TIMEOUT
+                )
+                elapsed = time.perf_counter() - start
+            usage = response.usage
+            metrics.observe_llm_request(elapsed, usage.prompt_tokens if usage else 0,
+                                        usage.completion_tokens if usage else 0)
+            return response.choices[0].message.content
+        except (APIConnectionError, InternalServerError, RateLimitError) as e:
+            metrics.observe_llm_error()
+            if attempt == REQUEST_MAX_RETRIES:
+                raise
+            delay = RETRY_BACKOFF ** attempt
+            logger.warning(f"模型請求失敗（第 {attempt + 1} 次）: {e}，{delay} 秒後重試")
+            time.sleep(delay)
+
+
+def cached_completion(prompt, *key_parts):
+    """先以 (模型名稱, key_parts) 查詢快取，未命中時才送出請求並寫入快取。"""
+    key = llm_cache.make_key(MODEL_NAME, *key_parts)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        return cached
+    content = chat_completion(prompt)
+    llm_cache.put(key, content)
+    return content
+
+
+def translation_cache_key(text, source_language, target_language):
+    return llm_cache.make_key(MODEL_NAME, 'translate', source_language, target_language, text)
+
+
 def detect_language(text):
-    detect_language_response = client.chat.completions.create(
-        model=MODEL_NAME,
-        messages=[{
-            "role": "user",
-            "content": f"Please detect the language of the following text and respond with only the language name in English: {text[:200]}"
-        }]
-    )
-    return detect_language_response.choices[0].message.content.strip().lower()
+    return cached_completion(
+        f"Please detect the language of the following text and respond with only the language name in English: {text[:200]}",
+        'detect', text[:200]
+    ).strip().lower()
 
 
 
@@ -36,59 +107,196 @@ def translate_text(text, source_language, target_language):
     if source_language == target_language:
         return text
     
-    translate_response = client.chat.completions.create(
-        model=MODEL_NAME,
-        messages=[{
-            "role": "user",
-            "content": f"請將以下 {source_language} 的內容翻譯為 {target_language}。請保持原文的段落結構，直接翻譯，不要做其他任何回覆或說明: {text}"
-        }]
+    key = translation_cache_key(text, source_language, target_language)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        return cached
+    translation = chat_completion(
+        f"請將以下 {source_language} 的內容翻譯為 {target_language}。請保持原文的段落結構，直接翻譯，不要做其他任何回覆或說明: {text}"
     )
-    return translate_response.choices[0].message.content
+    llm_cache.put(key, translation)
+    return translation
 
 
+CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]')
+NUMBERED_LINE_PATTERN = re.compile(r'^\s*\[(\d+)\]\s*(.*)$')
 
-def process_vtt(vtt_content, source_language):
-    # 分離 WEBVTT 標頭和內容
-    parts = vtt_content.split('\n\n', 1)
-    header = parts[0]
-    content = parts[1] if len(parts) > 1 else ""
 
-    # 使用正則表達式來分離時間戳和文本內容
-    pattern = r'(\d{2}:\d{2}:\d{2}\.\d{3} --> \d{2}:\d{2}:\d{2}\.\d{3})\n((?:(?!\n\d{2}:\d{2}:\d{2}\.\d{3}).)+)'
-    matches = re.findall(pattern, content, re.DOTALL)
-    
-    translated_vtt = header + "\n\n"
-    all_text = ""
-    
+def estimate_tokens(text):
+    """粗略估計 token 數：CJK 字元約一字一個 token，其餘約四個字元一個 token。"""
+    cjk_count = len(CJK_PATTERN.findall(text))
+    return cjk_count + (len(text) - cjk_count) // 4 + 1
+
+
+def build_batches(texts, token_budget=None, max_cues=None):
+    """依 token 預算將字幕切成多個批次，返回 (起始索引, 結束索引) 的列表。"""
+    token_budget = token_budget or BATCH_TOKEN_BUDGET
+    max_cues = max_cues or BATCH_MAX_CUES
+    batches = []
+    start = 0
+    tokens = 0
+    for i, text in enumerate(texts):
+        cue_tokens = estimate_tokens(text) + 3  # 編號與換行的額外開銷
+        if i > start and (tokens + cue_tokens > token_budget or i - start >= max_cues):
+            batches.append((start, i))
+            start = i
+            tokens = 0
+        tokens += cue_tokens
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+
+def parse_numbered_output(output, expected_count):
+    """將 "[n] 文字" 格式的輸出解析回列表；條數或編號不符時返回 None。"""
+    results = {}
+    current = None
+    for line in output.strip().split('\n'):
+        match = NUMBERED_LINE_PATTERN.match(line)
+        if match:
+            current = int(match.group(1))
+            results[current] = match.group(2).strip()
+        elif current is not None and line.strip():
+            # 模型有時會把一條翻譯拆成多行
+            results[current] += ' ' + line.strip()
+
+    if sorted(results) != list(range(1, expected_count + 1)):
+        return None
+    return [results[i] for i in range(1, expected_count + 1)]
+
+
+def translate_batch(texts, source_language, target_language):
+    """在一次請求中翻譯多條字幕，返回與輸入等長的翻譯列表。"""
+    if source_language == target_language:
+        return list(texts)
+    if len(texts) == 1:
+        return [translate_text(texts[0], source_language, target_language)]
+
+    numbered = '\n'.join(f"[{i}] {' '.join(text.split())}" for i, text in enumerate(texts, 1))
+    output = chat_completion(
+        f"請將以下 {len(texts)} 行編號的 {source_language} 字幕逐行翻譯為 {target_language}。每行翻譯前保留相同的編號（例如 [1]），輸出必須剛好 {len(texts)} 行，不要合併或拆分行，不要做其他任何回覆或說明:\n{numbered}"
+    )
+    translations = parse_numbered_output(output, len(texts))
+    if translations is not None:
+        return translations
+
+    # 條數不符時不重試同一批（連線錯誤的重試由 chat_completion 處理），直接對半拆分後再翻譯，
+    # 最終退回逐條翻譯；每層只發一次請求，最壞情況約為條數的兩倍
+    logger.warning(f"批次翻譯輸出條數不符（共 {len(texts)} 條），拆分後重新翻譯")
+    mid = len(texts) // 2
+    return (translate_batch(texts[:mid], source_language, target_language) +
+            translate_batch(texts[mid:], source_language, target_language))
+
+
+def translate_cues(texts, source_language, target_language, on_progress=None):
+    """並行翻譯字幕列表，啟用批次翻譯時合併請求，返回與輸入順序一致的翻譯列表。
+
+    on_progress(已完成條數, 總條數, [(索引, 翻譯), ...]) 在快取查詢後與每個批次完成時呼叫，
+    可用於即時顯示部分翻譯結果。
+    """
+    if source_language == target_language:
+        if on_progress is not None:
+            on_progress(len(texts), len(texts), list(enumerate(texts)))
+        return list(texts)
+
+    # 先查詢快取，只翻譯未命中且不重複的字幕（如 [Music]、[Applause]）
+    keys = [translation_cache_key(text, source_language, target_language) for text in texts]
+    cached = llm_cache.get_many(keys)
+    hit_count = sum(1 for key in keys if key in cached)
+    text_by_key = dict(zip(keys, texts))
+    pending_keys = [key for key in text_by_key if key not in cached]
+    pending_texts = [text_by_key[key] for key in pending_keys]
+
+    indexes_by_key = {}
+    for index, key in enumerate(keys):
+        indexes_by_key.setdefault(key, []).append(index)
+    done_count = 0
+
+    def notify(translations):
+        nonlocal done_count
+        if on_progress is None or not translations:
+            return
+        partial = sorted((index, text) for key, text in translations.items() for index in indexes_by_key[key])
+        done_count += len(partial)
+        on_progress(done_count, len(texts), partial)
+
+    notify(cached)
+
+    if BATCH_TRANSLATION:
+        batches = build_batches(pending_texts)
+    else:
+        batches = [(i, i + 1) for i in range(len(pending_texts))]
+
+    # executor.map 依提交順序返回結果，確保翻譯能按原時間戳重組
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+        results = executor.map(
+            metrics.propagate(
+                lambda batch: translate_batch(pending_texts[batch[0]:batch[1]], source_language, target_language)),
+            batches)
+        new_translations = {}
+        for (start, end), batch_result in zip(batches, results):
+            batch_translations = dict(zip(pending_keys[start:end], batch_result))
+            new_translations.update(batch_translations)
+            notify(batch_translations)
+
+    llm_cache.put_many(new_translations)
+    cached.update(new_translations)
+
+    logger.info(f"翻譯完成: {len(texts)} 條字幕，快取命中 {hit_count} 條，新翻譯 {len(pending_texts)} 條，{len(batches)} 個請求批次")
+    return [cached[key] for key in keys]
+
+
+def extract_cue_texts(vtt_content):
+    """返回每條字幕的文字（已去除前後空白）。"""
+    return parse_vtt(vtt_content).texts
+
+
+def process_vtt(vtt_content, source_language, on_cues=None):
+    """翻譯 VTT 字幕，返回 (翻譯後的 VTT, 全文)。
+
+    翻譯前先正規化字幕（移除行內標籤、去除自動字幕的捲動重複、合併為句子層級），
+    輸出的字幕沿用合併後的時間範圍。on_cues(已完成條數, 總條數, cues) 隨翻譯進度回報已完成的字幕，
+    cues 為 {'index', 'start', 'end', 'text'} 字典列表。
+    """
+    raw_cues = parse_vtt(vtt_content)
+    cues = normalize_cues(raw_cues)
+    logger.info(f"字幕正規化: {len(raw_cues)} 條 → {len(cues)} 條")
+    texts = cues.texts
+
+    def report_cues(done, total, partial):
+        if on_cues is None:
+            return
+        on_cues(done, total, [{'index': index, 'start': format_vtt_timestamp(cues.starts[index]),
+                               'end': format_vtt_timestamp(cues.ends[index]), 'text': text}
+                              for index, text in partial])
+
     # 检查是否为中文
     if "chinese" in source_language.lower() or "taiwanese mandarin" in source_language.lower():
         # 如果是中文，直接使用原文
-        translated_vtt = vtt_content
-        for _, text in matches:
-            all_text += text.strip() + " "
+        translations = texts
+        report_cues(len(texts), len(texts), list(enumerate(texts)))
     else:
         # 非中文时才进行翻译
-        translated_vtt = header + "\n\n"
-        for timestamp, text in matches:
-            translated_text = translate_text(text.strip(), source_language, "Traditional Chinese")
-            translated_vtt += f"{timestamp}\n{translated_text}\n\n"
-            all_text += translated_text + " "
-    
-    return translated_vtt.strip(), all_text.strip()
+        translations = translate_cues(texts, source_language, "Traditional Chinese", report_cues)
+
+    return cues.with_texts(translations).to_vtt(), ' '.join(translations)
+
+def translate_and_summarize(text, source_language=None):
+    # 呼叫端已知語言時（例如 process_vtt 的中文輸出）不再重複偵測
+    source_language = source_language or detect_language(text)
 
-def translate_and_summarize(text):
-    source_language = detect_language(text)
-    
     if "chinese" in source_language or "taiwanese mandarin" in source_language:
         translated_text = text
     else:
         translated_text = translate_text(text, source_language, "Traditional Chinese")
     
-    summary_response = client.chat.completions.create(
-        model=MODEL_NAME,
-        messages=[{
-            "role": "user",
-            "content": f"""請根據以下影片轉錄文字稿生成一份簡潔的繁體中文摘要（直接回答，不要做其他說明或評論，並提供HTML格式的內容，例如<ul><li>）。摘要應包含以下內容:
+    summary = summarize_cues([translated_text])
+    return translated_text, summary
+
+
+SENTENCE_END_PATTERN = re.compile(r'(?<=[。！？!?.])\s*')
+
+SUMMARY_PROMPT = """請根據以下影片轉錄文字稿生成一份簡潔的繁體中文摘要（直接回答，不要做其他說明或評論，並提供HTML格式的內容，例如<ul><li>）。摘要應包含以下內容:
 
             1. 影片的主要主題或目的
             2. 3-5個關鍵要點或主要論點
@@ -96,20 +304,115 @@ def translate_and_summarize(text):
             4. 總結全文的簡短段落
 
             請基於以下內容生成：：
-            {translated_text}
+            {content}
             """
-        }])
-    
-    summary = summary_response.choices[0].message.content
-    return translated_text, summary
+
+# 段落摘要的 prompt 不含段落編號，內容未變的段落即使位置改變也能命中快取
+CHUNK_SUMMARY_PROMPT = """以下是一段影片轉錄文字稿的節錄。請以繁體中文條列這段內容的主要論點、重要事實與結論（直接回答，純文字，不要做其他說明或評論）：
+{content}
+"""
+
+REDUCE_SUMMARY_PROMPT = """以下是同一部影片依時間順序排列的各段重點。請根據這些重點生成一份簡潔的繁體中文摘要（直接回答，不要做其他說明或評論，並提供HTML格式的內容，例如<ul><li>）。摘要應包含以下內容:
+
+            1. 影片的主要主題或目的
+            2. 3-5個關鍵要點或主要論點
+            3. 任何重要的結論或呼籲行動
+            4. 總結全文的簡短段落
+
+            各段重點如下：
+            {content}
+            """
+
+
+def _split_long_text(text, token_budget):
+    """將超過預算的單一文字依句尾標點切成多段。"""
+    pieces = []
+    current = ''
+    sentences = []
+    for sentence in SENTENCE_END_PATTERN.split(text):
+        # 沒有標點的超長句子直接依字數切開（以 CJK 一字一 token 的最壞情況估計）
+        sentences.extend(sentence[i:i + token_budget] for i in range(0, len(sentence), token_budget))
+    for sentence in sentences:
+        if current and estimate_tokens(current + sentence) > token_budget:
+            pieces.append(current)
+            current = ''
+        current += sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _is_chunk_boundary(unit, unit_tokens, target_tokens):
+    # 以文字的 CRC32 決定是否在此處分段，機率與其 token 數成正比，平均每 target_tokens 個 token 分段一次；
+    # 判斷只取決於這段文字本身，不受前面內容影響
+    return zlib.crc32(unit.encode('utf-8')) < (1 << 32) * unit_tokens / target_tokens
+
+
+def split_by_token_budget(texts, token_budget=None, separator=' '):
+    """沿字幕邊界將文字分段，返回每段合併後的文字列表，每段不超過 token 預算。
+
+    分段點由內容決定而非逐段填滿預算：文字稿某處修改時只有該處附近的段落改變，
+    其餘段落的文字與快取鍵不變，分段摘要得以沿用。
+    """
+    token_budget = token_budget or SUMMARY_CHUNK_TOKEN_BUDGET
+    target_tokens = min(SUMMARY_CHUNK_TARGET_TOKENS, token_budget // 2) or 1
+    min_tokens = min(SUMMARY_CHUNK_MIN_TOKENS, token_budget // 6)
+    chunks = []
+    current = []
+    tokens = 0
+    for text in texts:
+        if estimate_tokens(text) > token_budget:
+            units = _split_long_text(text, token_budget)
+        else:
+            units = [text] if text else []
+        for unit in units:
+            unit_tokens = estimate_tokens(unit) + 1  # 分隔字元的額外開銷
+            if current and tokens + unit_tokens > token_budget:
+                chunks.append(separator.join(current))
+                current = []
+                tokens = 0
+            current.append(unit)
+            tokens += unit_tokens
+            if tokens >= min_tokens and _is_chunk_boundary(unit, unit_tokens, target_tokens):
+                chunks.append(separator.join(current))
+                current = []
+                tokens = 0
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
+
+
+def summarize_cues(texts):
+    """分層摘要：短文字稿直接摘要；長文字稿先並行摘要各段（map），再合併為最終 HTML 摘要（reduce）。
+
+    各段摘要以內容定址快取，文字稿只有部分改變時，未變的段落不會重新摘要。
+    """
+    chunks = split_by_token_budget(texts)
+    if len(chunks) <= 1:
+        prompt = SUMMARY_PROMPT.format(content=chunks[0] if chunks else '')
+        return cached_completion(prompt, 'summary', prompt)
+
+    while len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+            partials = list(executor.map(
+                metrics.propagate(
+                    lambda chunk: cached_completion(CHUNK_SUMMARY_PROMPT.format(content=chunk), 'summary_chunk',
+                                                    chunk)),
+                chunks))
+        logger.info(f"分段摘要完成: {len(chunks)} 段")
+        # 合併後仍超過預算時，將各段重點再分段摘要，直到能放進單一請求
+        reduced = split_by_token_budget(partials, separator='\n\n')
+        if len(reduced) >= len(chunks):
+            # 段落摘要沒有變短時不再遞迴，直接合併
+            reduced = ['\n\n'.join(partials)]
+        chunks = reduced
+
+    prompt = REDUCE_SUMMARY_PROMPT.format(content=chunks[0])
+    return cached_completion(prompt, 'summary_reduce', prompt)
 
 
 
 def extract_text_from_vtt(vtt_content):
-    lines = vtt_content.split('\n')
-    text_lines = []
-    for line in lines:
-        if not line.strip() or '-->' in line or line.strip() == 'WEBVTT':
-            continue
-        text_lines.append(line.strip())
-    return ' '.join(text_lines)
\ No newline at end of file
+    """返回字幕全文（不含檔頭、識別碼與 NOTE 區塊），每行以空格連接。"""
+    return ' '.join(line.strip() for text in parse_vtt(vtt_content).texts
+                    for line in text.split('\n') if line.strip())
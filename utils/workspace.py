@@ -0,0 +1,113 @@
+import os
+import time
+import shutil
+import logging
+import tempfile
+import threading
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# 每次處理影片都在 SCRATCH_ROOT 下建立獨立的暫存目錄，避免並行任務互相覆蓋檔案
+SCRATCH_ROOT = 'temp'
+KEEP_WORK_DIRS = False  # 除錯用：處理完成後保留暫存目錄
+MAX_SCRATCH_BYTES = 20 * 1024 * 1024 * 1024  # 暫存區總大小上限，超過時拒絕新的處理
+# 暫存目錄可能屬於其他進程（如 ingest.py），以目錄內的 OWNER_FILE 記錄建立者的 pid；
+# 清除時略過建立者仍在執行、或最近 MIN_IDLE_SECONDS 秒內有修改的目錄
+OWNER_FILE = '.owner'
+MIN_IDLE_SECONDS = 3600
+
+_active_dirs = set()
+_lock = threading.Lock()
+
+
+def get_scratch_usage():
+    """返回暫存區目前佔用的位元組數。"""
+    total = 0
+    for root, _, files in os.walk(SCRATCH_ROOT):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass  # 檔案可能剛被其他任務刪除
+    return total
+
+
+def create_work_dir(prefix='job'):
+    """建立新的暫存目錄並登記為使用中；暫存區超過大小上限時拋出 OSError。"""
+    os.makedirs(SCRATCH_ROOT, exist_ok=True)
+    usage = get_scratch_usage()
+    if usage > MAX_SCRATCH_BYTES:
+        raise OSError(f"暫存區已使用 {usage} 位元組，超過上限 {MAX_SCRATCH_BYTES}")
+    work_dir = tempfile.mkdtemp(prefix=f"{prefix}_", dir=SCRATCH_ROOT)
+    with open(os.path.join(work_dir, OWNER_FILE), 'w') as file:
+        file.write(str(os.getpid()))
+    with _lock:
+        _active_dirs.add(os.path.abspath(work_dir))
+    logger.info(f"建立暫存目錄: {work_dir}")
+    return work_dir
+
+
+def cleanup_work_dir(work_dir):
+    with _lock:
+        _active_dirs.discard(os.path.abspath(work_dir))
+    if KEEP_WORK_DIRS:
+        logger.info(f"保留暫存目錄: {work_dir}")
+        return
+    shutil.rmtree(work_dir, ignore_errors=True)
+    logger.info(f"已移除暫存目錄: {work_dir}")
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # 進程存在但屬於其他使用者
+    return True
+
+
+def _in_use(path):
+    """判斷其他進程是否可能仍在使用暫存目錄：建立者仍在執行，或最近有修改。"""
+    try:
+        with open(os.path.join(path, OWNER_FILE), 'r') as file:
+            pid = int(file.read().strip())
+    except (OSError, ValueError):
+        pid = None
+    if pid is not None and pid != os.getpid() and _pid_alive(pid):
+        return True
+    latest = os.path.getmtime(path)
+    for root, dirs, files in os.walk(path):
+        for name in dirs + files:
+            try:
+                latest = max(latest, os.path.getmtime(os.path.join(root, name)))
+            except OSError:
+                pass
+    return time.time() - latest < MIN_IDLE_SECONDS
+
+
+def clear_scratch():
+    """移除所有未被使用的暫存目錄，返回移除的目錄數。
+
+    略過本進程進行中任務的目錄，以及其他進程（見 _in_use）可能仍在使用的目錄。
+    """
+    if not os.path.isdir(SCRATCH_ROOT):
+        return 0
+    removed = 0
+    with _lock:
+        active = set(_active_dirs)
+    for name in os.listdir(SCRATCH_ROOT):
+        path = os.path.abspath(os.path.join(SCRATCH_ROOT, name))
+        if path in active:
+            continue
+        if os.path.isdir(path):
+            if _in_use(path):
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.remove(path)
+        removed += 1
+    logger.info(f"已清除 {removed} 個暫存項目")
+    return removed